@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+from enum import Enum
+
+class PopularityEvent(str, Enum):
+    VIEW = "view"
+    CLICK = "click"
+
+class TrackEventCreate(BaseModel):
+    service_id: str
+    event: PopularityEvent = PopularityEvent.VIEW
@@ -8,6 +8,9 @@ class Review(BaseDBModel):
     title: str
     body: str
     rating: float
+    rating_uiux: Optional[float] = None
+    rating_cost: Optional[float] = None
+    rating_support: Optional[float] = None
     author_name: str
     author_role: str
 
@@ -16,6 +19,9 @@ class ReviewCreate(BaseModel):
     title: str
     body: str
     rating: float
+    rating_uiux: Optional[float] = None
+    rating_cost: Optional[float] = None
+    rating_support: Optional[float] = None
     author_name: str
     author_role: str
 
@@ -23,5 +29,8 @@ class ReviewUpdate(BaseModel):
     title: Optional[str] = None
     body: Optional[str] = None
     rating: Optional[float] = None
+    rating_uiux: Optional[float] = None
+    rating_cost: Optional[float] = None
+    rating_support: Optional[float] = None
     author_name: Optional[str] = None
     author_role: Optional[str] = None
@@ -9,6 +9,16 @@ class PricingPlan(BaseModel):
     price_jpy: int
     billing_cycle: str
 
+# 一覧表示用にサービスへ埋め込むベンダー情報
+class VendorSnapshot(BaseModel):
+    name: str
+    logo: str
+
+# 一覧表示用にサービスへ埋め込むカテゴリ情報
+class CategorySnapshot(BaseModel):
+    name: str
+    icon: str
+
 # Serviceモデル
 class Service(BaseDBModel):
     name: str
@@ -27,6 +37,13 @@ class Service(BaseDBModel):
     hero_image: str
     gallery_images: List[str] = []
     official_url: str
+    # 価格インデックス用の派生フィールド（pricing_planから算出）
+    price_monthly_min: Optional[float] = None
+    price_monthly_max: Optional[float] = None
+    has_free_plan: bool = False
+    # ベンダー・カテゴリのスナップショット（企業・カテゴリの更新時に一括反映）
+    vendor: Optional[VendorSnapshot] = None
+    category: Optional[CategorySnapshot] = None
 
 # Service作成用モデル
 class ServiceCreate(BaseModel):
@@ -3,6 +3,7 @@ import sys
 import logging
 import uuid
 import json
+import asyncio
 import bcrypt
 from pathlib import Path
 from typing import List, Optional, Dict, Any
@@ -21,13 +22,29 @@ ROOT_DIR = Path(__file__).parent
 sys.path.append(str(ROOT_DIR))
 
 # モデルのインポート
-from models.base import BaseDBModel
+from models.base import BaseDBModel, generate_uuid
 from models.service import Service, ServiceCreate, ServiceUpdate, PricingPlan
 from models.company import Company, CompanyCreate, CompanyUpdate
 from models.category import Category, CategoryCreate, CategoryUpdate
 from models.article import Article, ArticleCreate, ArticleUpdate
 from models.review import Review, ReviewCreate, ReviewUpdate
 from models.user import User, UserCreate, UserUpdate, UserLogin, UserRole, TokenData
+from models.popularity import PopularityEvent, TrackEventCreate
+from utils.datagen import generate_dataset, DatasetExistsError, DEFAULT_BATCH_SIZE
+from utils.similarity import SimilarityIndex, ensure_similarity_indexes
+from utils.suggest import SuggestIndex, service_popularity, MAX_SUGGESTIONS
+from utils.popularity import PopularityCounter
+from utils.snapshots import (
+    attach_snapshots, fan_out_company, fan_out_category, snapshot_changed, check_snapshots,
+    ensure_snapshot_indexes, VENDOR_SNAPSHOT_FIELDS, CATEGORY_SNAPSHOT_FIELDS
+)
+from utils.article_tags import ArticleTagIndex, ensure_article_indexes, ARTICLE_INDEX_FIELDS
+from utils.http_cache import CachePurger, cache_headers_middleware
+from utils.rating_history import (
+    COLLECTION as RATING_HISTORY_COLLECTION, apply_review_change, ensure_rating_history_indexes, summarize
+)
+from utils.catalog_snapshot import CatalogSnapshot, DatabaseHealth, write_snapshot, degraded_mode_middleware
+from utils.pricing import pricing_fields, price_query, PRICE_SORTS, DEFAULT_SORT, ensure_price_indexes, backfill_price_fields
 
 # 環境変数の読み込み
 ROOT_DIR = Path(__file__).parent
@@ -52,6 +69,8 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 1週間
 
 # OAuth2スキーマ
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+# ログインしていなくても利用できるエンドポイント用（トークンがなければ None）
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
 # メインアプリの作成
 app = FastAPI(
@@ -67,9 +86,32 @@ ALLOWED_ORIGINS = [origin.strip() for origin in ALLOWED_ORIGINS_STRING.split(','
 # 環境設定
 APP_ENV = os.environ.get("APP_ENV", "development")
 
+# 記事のタグインデックス（起動時に構築）
+article_tag_index = ArticleTagIndex()
+
+# 閲覧・クリック数のバッファ（数秒おきにまとめて書き込む）
+popularity_counter = PopularityCounter(db)
+
+# Nginxキャッシュの更新先（未設定の場合は更新しない）
+cache_purger = CachePurger(os.environ.get("CACHE_PURGE_URL"))
+
+# MongoDB障害時に読み取りAPIを返すカタログスナップショット
+CATALOG_SNAPSHOT_INTERVAL = int(os.environ.get("CATALOG_SNAPSHOT_INTERVAL", "300"))
+DEGRADED_LATENCY_MS = float(os.environ.get("DEGRADED_LATENCY_MS", "500"))
+catalog_snapshot = CatalogSnapshot(
+    Path(os.environ.get("CATALOG_SNAPSHOT_PATH", ROOT_DIR / "data" / "catalog_snapshot.msgpack"))
+)
+database_health = DatabaseHealth(db, latency_threshold_ms=DEGRADED_LATENCY_MS)
+
 # APIルーターの作成
 api_router = APIRouter(prefix="/api")
 
+# 類似サービスインデックス（起動時にバックグラウンドで構築）
+similarity_index = SimilarityIndex()
+
+# 入力補完用の前方一致インデックス（起動時に構築）
+suggest_index = SuggestIndex()
+
 # トークン生成関数
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -101,6 +143,12 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         raise credentials_exception
     return user
 
+# ログインしていれば現在のユーザーを、未ログインなら None を返す依存関数
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme)):
+    if token is None:
+        return None
+    return await get_current_user(token)
+
 # 管理者ユーザーを取得する依存関数
 async def get_admin_user(current_user: dict = Depends(get_current_user)):
     if current_user["role"] != UserRole.ADMIN:
@@ -146,6 +194,15 @@ async def create_initial_user():
         await users_collection.insert_one(admin_user)
         logger.info("初期管理者ユーザーが作成されました")
 
+# ヘルスチェックエンドポイント（DBにはアクセスしない）
+@api_router.get("/health")
+async def health_check():
+    return {
+        "status": "degraded" if database_health.degraded else "ok",
+        "database_latency_ms": database_health.latency_ms,
+        "snapshot_generated_at": catalog_snapshot.generated_at,
+    }
+
 # 認証エンドポイント
 @api_router.post("/auth/login", response_model=dict)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
@@ -173,9 +230,49 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     return {"access_token": access_token, "token_type": "bearer"}
 
 # サービス関連エンドポイント
+@api_router.post("/track", status_code=status.HTTP_202_ACCEPTED)
+async def track_event(event: TrackEventCreate):
+    # サービスIDはまずインメモリの類似サービスインデックスで検証し、見つからない場合のみ
+    # （追加直後で再構築待ちの可能性があるため）インデックス付きの find_one で確認する。
+    # インデックス構築前・縮退運転中はDBに依存せず受け付け、書き込み時に存在しないIDを除外する
+    if (
+        similarity_index.ready
+        and not database_health.degraded
+        and event.service_id not in similarity_index
+        and not await db.services.find_one({"id": event.service_id}, {"_id": 1})
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"ID '{event.service_id}' を持つサービスが見つかりません"
+        )
+    popularity_counter.record(event.service_id, event.event.value)
+    return {"status": "accepted"}
+
+@api_router.get("/services/popular", response_model=List[Service])
+async def get_popular_services(
+    days: int = Query(7, ge=1, le=90),
+    limit: int = Query(20, ge=1, le=100),
+    event: PopularityEvent = PopularityEvent.VIEW
+):
+    ranking = await popularity_counter.top_services(days, limit, event.value)
+    service_ids = [service_id for service_id, _ in ranking]
+    services = await db.services.find({"id": {"$in": service_ids}}).to_list(len(service_ids))
+    order = {service_id: i for i, service_id in enumerate(service_ids)}
+    services.sort(key=lambda s: order[s["id"]])
+    return services
+
 @api_router.get("/services", response_model=List[Service])
-async def get_services():
-    services = await db.services.find().to_list(1000)
+async def get_services(
+    sort: Optional[str] = Query(None, pattern="^(price_asc|price_desc)$"),
+    min_price: Optional[float] = Query(None, ge=0, description="最安プランの月額（円）の下限"),
+    max_price: Optional[float] = Query(None, ge=0, description="最安プランの月額（円）の上限"),
+    free_only: bool = False,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=1000)
+):
+    cursor = db.services.find(price_query(min_price, max_price, free_only, priced_only=bool(sort)))
+    cursor = cursor.sort(PRICE_SORTS[sort] if sort else DEFAULT_SORT)
+    services = await cursor.skip(skip).limit(limit).to_list(limit)
     return services
 
 @api_router.get("/services/{slug}", response_model=Service)
@@ -188,18 +285,73 @@ async def get_service(slug: str):
         )
     return service
 
+@api_router.get("/services/{slug}/similar", response_model=List[Service])
+async def get_similar_services(slug: str, limit: int = Query(10, ge=1, le=50)):
+    if not similarity_index.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="類似サービスインデックスを構築中です",
+            headers={"Retry-After": "10"},
+        )
+    service = await db.services.find_one({"slug": slug}, {"id": 1})
+    if not service:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"スラッグ '{slug}' を持つサービスが見つかりません"
+        )
+    
+    neighbor_ids = [service_id for service_id, _ in similarity_index.neighbors(service["id"], limit)]
+    similar = await db.services.find({"id": {"$in": neighbor_ids}}).to_list(len(neighbor_ids))
+    # 類似度の降順に並べ直す
+    order = {service_id: i for i, service_id in enumerate(neighbor_ids)}
+    similar.sort(key=lambda s: order[s["id"]])
+    return similar
+
+@api_router.get("/services/{slug}/rating-history")
+async def get_service_rating_history(
+    slug: str,
+    granularity: str = Query("month", pattern="^(month|week)$"),
+    limit: int = Query(24, ge=1, le=260)
+):
+    service = await db.services.find_one({"slug": slug}, {"id": 1})
+    if not service:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"スラッグ '{slug}' を持つサービスが見つかりません"
+        )
+    
+    # 直近のバケットを取得して古い順に並べる
+    buckets = await db[RATING_HISTORY_COLLECTION].find(
+        {"service_id": service["id"], "granularity": granularity, "count": {"$gt": 0}}
+    ).sort("bucket", -1).to_list(limit)
+    buckets.reverse()
+    return {
+        "service_id": service["id"],
+        "granularity": granularity,
+        "buckets": [summarize(bucket) for bucket in buckets],
+    }
+
 @api_router.post("/services", response_model=Service)
 async def create_service(service: ServiceCreate, current_user: dict = Depends(get_admin_user)):
     service_dict = service.dict()
+    service_dict["id"] = generate_uuid()
+    service_dict.update(pricing_fields(service_dict["pricing_plan"]))
+    await attach_snapshots(db, service_dict)
     service_dict["created_at"] = datetime.now(timezone.utc)
     service_dict["updated_at"] = datetime.now(timezone.utc)
     result = await db.services.insert_one(service_dict)
     created_service = await db.services.find_one({"_id": result.inserted_id})
+    await run_in_executor(similarity_index.upsert, created_service)
+    suggest_index.upsert("service", created_service)
+    cache_purger.purge(["/api/services", f"/api/services/{created_service['slug']}"])
     return created_service
 
 @api_router.put("/services/{service_id}", response_model=Service)
 async def update_service(service_id: str, service: ServiceUpdate, current_user: dict = Depends(get_admin_user)):
     service_dict = service.dict(exclude_unset=True)
+    if service_dict.get("pricing_plan") is not None:
+        service_dict.update(pricing_fields(service_dict["pricing_plan"]))
+    await attach_snapshots(db, service_dict)
     service_dict["updated_at"] = datetime.now(timezone.utc)
     
     existing_service = await db.services.find_one({"id": service_id})
@@ -211,6 +363,14 @@ async def update_service(service_id: str, service: ServiceUpdate, current_user:
     
     await db.services.update_one({"id": service_id}, {"$set": service_dict})
     updated_service = await db.services.find_one({"id": service_id})
+    await run_in_executor(similarity_index.upsert, updated_service)
+    suggest_index.upsert("service", updated_service)
+    cache_purger.purge([
+        "/api/services",
+        f"/api/services/{existing_service['slug']}",
+        f"/api/services/{updated_service['slug']}",
+        f"/api/services/{updated_service['slug']}/similar",
+    ])
     return updated_service
 
 @api_router.delete("/services/{service_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -223,6 +383,9 @@ async def delete_service(service_id: str, current_user: dict = Depends(get_admin
         )
     
     await db.services.delete_one({"id": service_id})
+    await run_in_executor(similarity_index.remove, service_id)
+    suggest_index.remove("service", service_id)
+    cache_purger.purge(["/api/services", f"/api/services/{existing_service['slug']}"])
     return None
 
 # カテゴリ関連エンドポイント
@@ -244,10 +407,13 @@ async def get_category(slug: str):
 @api_router.post("/categories", response_model=Category)
 async def create_category(category: CategoryCreate, current_user: dict = Depends(get_admin_user)):
     category_dict = category.dict()
+    category_dict["id"] = generate_uuid()
     category_dict["created_at"] = datetime.now(timezone.utc)
     category_dict["updated_at"] = datetime.now(timezone.utc)
     result = await db.categories.insert_one(category_dict)
     created_category = await db.categories.find_one({"_id": result.inserted_id})
+    suggest_index.upsert("category", created_category)
+    cache_purger.purge(["/api/categories", f"/api/categories/{created_category.get('slug', '')}"])
     return created_category
 
 @api_router.put("/categories/{category_id}", response_model=Category)
@@ -264,6 +430,16 @@ async def update_category(category_id: str, category: CategoryUpdate, current_us
     
     await db.categories.update_one({"id": category_id}, {"$set": category_dict})
     updated_category = await db.categories.find_one({"id": category_id})
+    suggest_index.upsert("category", updated_category)
+    
+    # 名前・アイコンの変更をサービスのスナップショットへ一括反映
+    if snapshot_changed(category_dict, CATEGORY_SNAPSHOT_FIELDS) and await fan_out_category(db, updated_category, category_id):
+        cache_purger.purge(["/api/services"])
+    cache_purger.purge([
+        "/api/categories",
+        f"/api/categories/{existing_category.get('slug', '')}",
+        f"/api/categories/{updated_category.get('slug', '')}",
+    ])
     return updated_category
 
 @api_router.delete("/categories/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -276,6 +452,10 @@ async def delete_category(category_id: str, current_user: dict = Depends(get_adm
         )
     
     await db.categories.delete_one({"id": category_id})
+    suggest_index.remove("category", category_id)
+    if await fan_out_category(db, None, category_id):
+        cache_purger.purge(["/api/services"])
+    cache_purger.purge(["/api/categories", f"/api/categories/{existing_category.get('slug', '')}"])
     return None
 
 # 企業関連エンドポイント
@@ -297,10 +477,13 @@ async def get_company(slug: str):
 @api_router.post("/companies", response_model=Company)
 async def create_company(company: CompanyCreate, current_user: dict = Depends(get_admin_user)):
     company_dict = company.dict()
+    company_dict["id"] = generate_uuid()
     company_dict["created_at"] = datetime.now(timezone.utc)
     company_dict["updated_at"] = datetime.now(timezone.utc)
     result = await db.companies.insert_one(company_dict)
     created_company = await db.companies.find_one({"_id": result.inserted_id})
+    suggest_index.upsert("company", created_company)
+    cache_purger.purge(["/api/companies", f"/api/companies/{created_company.get('slug', '')}"])
     return created_company
 
 @api_router.put("/companies/{company_id}", response_model=Company)
@@ -317,6 +500,16 @@ async def update_company(company_id: str, company: CompanyUpdate, current_user:
     
     await db.companies.update_one({"id": company_id}, {"$set": company_dict})
     updated_company = await db.companies.find_one({"id": company_id})
+    suggest_index.upsert("company", updated_company)
+    
+    # 名前・ロゴの変更をサービスのスナップショットへ一括反映
+    if snapshot_changed(company_dict, VENDOR_SNAPSHOT_FIELDS) and await fan_out_company(db, updated_company, company_id):
+        cache_purger.purge(["/api/services"])
+    cache_purger.purge([
+        "/api/companies",
+        f"/api/companies/{existing_company.get('slug', '')}",
+        f"/api/companies/{updated_company.get('slug', '')}",
+    ])
     return updated_company
 
 @api_router.delete("/companies/{company_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -329,14 +522,44 @@ async def delete_company(company_id: str, current_user: dict = Depends(get_admin
         )
     
     await db.companies.delete_one({"id": company_id})
+    suggest_index.remove("company", company_id)
+    if await fan_out_company(db, None, company_id):
+        cache_purger.purge(["/api/services"])
+    cache_purger.purge(["/api/companies", f"/api/companies/{existing_company.get('slug', '')}"])
     return None
 
 # 記事関連エンドポイント
 @api_router.get("/articles", response_model=List[Article])
-async def get_articles():
-    articles = await db.articles.find().to_list(1000)
+async def get_articles(
+    tag: Optional[str] = None,
+    include_unpublished: bool = False,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=1000),
+    current_user: Optional[dict] = Depends(get_optional_user)
+):
+    query = {}
+    # タグは保存時と同様に前後の空白を除いて比較する
+    tag = (tag or "").strip()
+    if tag:
+        query["tags"] = tag
+    # 下書き・公開予約中の記事は編集者と管理者のみ取得できる
+    if include_unpublished:
+        if current_user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="未公開の記事の取得にはログインが必要です",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        await get_editor_or_admin_user(current_user)
+    else:
+        query["published_at"] = {"$lte": datetime.now(timezone.utc)}
+    articles = await db.articles.find(query).sort("published_at", -1).skip(skip).to_list(limit)
     return articles
 
+@api_router.get("/articles/tags")
+async def get_article_tags(limit: Optional[int] = Query(None, ge=1, le=1000)):
+    return {"tags": [{"tag": tag, "count": count} for tag, count in article_tag_index.tag_counts(limit)]}
+
 @api_router.get("/articles/{slug}", response_model=Article)
 async def get_article(slug: str):
     article = await db.articles.find_one({"slug": slug})
@@ -347,13 +570,31 @@ async def get_article(slug: str):
         )
     return article
 
+@api_router.get("/articles/{slug}/related", response_model=List[Article])
+async def get_related_articles(slug: str, limit: int = Query(5, ge=1, le=20)):
+    article = await db.articles.find_one({"slug": slug}, {"id": 1})
+    if not article:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"スラッグ '{slug}' を持つ記事が見つかりません"
+        )
+    
+    related_ids = [article_id for article_id, _ in article_tag_index.related(article["id"], limit)]
+    related = await db.articles.find({"id": {"$in": related_ids}}).to_list(len(related_ids))
+    order = {article_id: i for i, article_id in enumerate(related_ids)}
+    related.sort(key=lambda a: order[a["id"]])
+    return related
+
 @api_router.post("/articles", response_model=Article)
 async def create_article(article: ArticleCreate, current_user: dict = Depends(get_editor_or_admin_user)):
     article_dict = article.dict()
+    article_dict["id"] = generate_uuid()
     article_dict["created_at"] = datetime.now(timezone.utc)
     article_dict["updated_at"] = datetime.now(timezone.utc)
     result = await db.articles.insert_one(article_dict)
     created_article = await db.articles.find_one({"_id": result.inserted_id})
+    article_tag_index.upsert(created_article)
+    cache_purger.purge(["/api/articles", "/api/articles/tags", f"/api/articles/{created_article['slug']}"])
     return created_article
 
 @api_router.put("/articles/{article_id}", response_model=Article)
@@ -370,6 +611,13 @@ async def update_article(article_id: str, article: ArticleUpdate, current_user:
     
     await db.articles.update_one({"id": article_id}, {"$set": article_dict})
     updated_article = await db.articles.find_one({"id": article_id})
+    article_tag_index.upsert(updated_article)
+    cache_purger.purge([
+        "/api/articles",
+        "/api/articles/tags",
+        f"/api/articles/{existing_article['slug']}",
+        f"/api/articles/{updated_article['slug']}",
+    ])
     return updated_article
 
 @api_router.delete("/articles/{article_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -382,6 +630,8 @@ async def delete_article(article_id: str, current_user: dict = Depends(get_edito
         )
     
     await db.articles.delete_one({"id": article_id})
+    article_tag_index.remove(article_id)
+    cache_purger.purge(["/api/articles", "/api/articles/tags", f"/api/articles/{existing_article['slug']}"])
     return None
 
 # レビュー関連エンドポイント
@@ -414,12 +664,14 @@ async def create_review(review: ReviewCreate, current_user: dict = Depends(get_c
         )
     
     review_dict = review.dict()
+    review_dict["id"] = generate_uuid()
     review_dict["user_id"] = current_user["id"]
     review_dict["created_at"] = datetime.now(timezone.utc)
     review_dict["updated_at"] = datetime.now(timezone.utc)
     
     result = await db.reviews.insert_one(review_dict)
     created_review = await db.reviews.find_one({"_id": result.inserted_id})
+    await apply_review_change(db, None, created_review)
     
     # サービスの評価を更新
     await update_service_rating(review.service_id)
@@ -447,9 +699,11 @@ async def update_review(review_id: str, review: ReviewUpdate, current_user: dict
     
     await db.reviews.update_one({"id": review_id}, {"$set": review_dict})
     updated_review = await db.reviews.find_one({"id": review_id})
+    await apply_review_change(db, existing_review, updated_review)
     
     # サービスの評価を更新
     await update_service_rating(existing_review["service_id"])
+    cache_purger.purge([f"/api/reviews/{review_id}"])
     
     return updated_review
 
@@ -471,9 +725,11 @@ async def delete_review(review_id: str, current_user: dict = Depends(get_current
     
     service_id = existing_review["service_id"]
     await db.reviews.delete_one({"id": review_id})
+    await apply_review_change(db, existing_review, None)
     
     # サービスの評価を更新
     await update_service_rating(service_id)
+    cache_purger.purge([f"/api/reviews/{review_id}"])
     
     return None
 
@@ -493,17 +749,36 @@ async def update_service_rating(service_id: str):
             {"id": service_id},
             {"$set": {"rating": avg_rating, "review_count": review_count, "updated_at": datetime.now(timezone.utc)}}
         )
+        suggest_index.set_popularity("service", service_id, service_popularity(review_count, avg_rating))
     else:
         # レビューがない場合は0にリセット
         await db.services.update_one(
             {"id": service_id},
             {"$set": {"rating": 0, "review_count": 0, "updated_at": datetime.now(timezone.utc)}}
         )
+        suggest_index.set_popularity("service", service_id, 0.0)
+    
+    # レビュー一覧と評価が変わったサービス詳細のキャッシュを更新
+    if not cache_purger.enabled:
+        return
+    service = await db.services.find_one({"id": service_id}, {"slug": 1})
+    cache_purger.purge([
+        "/api/reviews",
+        f"/api/services/{service['slug']}" if service else None,
+        f"/api/services/{service['slug']}/rating-history" if service else None,
+    ])
 
 # 検索エンドポイント
 @api_router.get("/search")
-async def search(q: str = "", filters: str = ""):
-    query = {}
+async def search(
+    q: str = "",
+    filters: str = "",
+    sort: Optional[str] = Query(None, pattern="^(price_asc|price_desc)$"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    free_only: bool = False
+):
+    query = price_query(min_price, max_price, free_only, priced_only=bool(sort))
     
     # 検索キーワードがある場合
     if q:
@@ -529,9 +804,23 @@ async def search(q: str = "", filters: str = ""):
             )
     
     # サービスを検索
-    services = await db.services.find(query).to_list(1000)
+    cursor = db.services.find(query)
+    if sort:
+        cursor = cursor.sort(PRICE_SORTS[sort])
+    services = await cursor.limit(1000).to_list(1000)
     return {"results": services, "count": len(services)}
 
+# 入力補完エンドポイント
+@api_router.get("/suggest")
+async def suggest(q: str = "", limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS)):
+    suggestions = suggest_index.search(q, limit)
+    return {
+        "suggestions": [
+            {"type": s["type"], "id": s["id"], "name": s["name"], "slug": s["slug"]}
+            for s in suggestions
+        ]
+    }
+
 # シードデータエンドポイント（開発環境のみ）
 if APP_ENV != "production":
     @api_router.post("/seed", status_code=status.HTTP_201_CREATED)
@@ -631,23 +920,188 @@ if APP_ENV != "production":
         # 新しいレビューを挿入
         await db.reviews.insert_many(reviews)
         
+        schedule_index_rebuild()
         return {"message": "シードデータが正常に作成されました"}
 
+    # 負荷検証用の合成データ生成（既存データは削除しない）
+    @api_router.post("/seed/synthetic", status_code=status.HTTP_201_CREATED)
+    async def seed_synthetic_data(
+        categories: int = Query(100, ge=1, le=10000),
+        companies: int = Query(500, ge=1, le=100000),
+        services: int = Query(10000, ge=0, le=1000000),
+        reviews: int = Query(100000, ge=0, le=10000000),
+        seed: int = 42,
+        batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=10000),
+        current_user: dict = Depends(get_admin_user)
+    ):
+        try:
+            inserted = await generate_dataset(
+                db,
+                categories=categories,
+                companies=companies,
+                services=services,
+                reviews=reviews,
+                seed=seed,
+                batch_size=batch_size,
+                user_id=current_user["id"],
+            )
+        except DatasetExistsError as e:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+        schedule_index_rebuild()
+        return {"message": "合成データが正常に作成されました", "inserted": inserted}
+
+# ブロッキング処理（インメモリインデックスの更新など）をスレッドプールで実行する
+async def run_in_executor(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, func, *args)
+
+# シードなどハンドラーを経由しない一括投入の後にインメモリインデックスを作り直す
+def schedule_index_rebuild():
+    asyncio.create_task(build_similarity_index())
+    asyncio.create_task(build_suggest_index())
+
+# 類似サービスインデックスの構築
+SIMILARITY_FIELDS = {
+    "_id": 0, "id": 1, "short_description": 1, "long_description": 1, "pros": 1, "cons": 1,
+    "category_id": 1, "vendor_id": 1, "pricing_plan": 1,
+}
+# 再構築が重なると先に終わった構築が保留中の更新を消費してしまうため直列化する
+similarity_build_lock = asyncio.Lock()
+
+async def build_similarity_index():
+    async with similarity_build_lock:
+        # 読み出し中に届いた更新も構築後に再適用されるよう、読み出し前に構築中とする
+        similarity_index.begin_build()
+        try:
+            services = await db.services.find({}, SIMILARITY_FIELDS).to_list(None)
+            await run_in_executor(similarity_index.build, services)
+        except Exception as e:
+            similarity_index.abort_build()
+            logger.error(f"類似サービスインデックスの構築に失敗しました: {str(e)}")
+
+# 入力補完インデックスの構築
+suggest_build_lock = asyncio.Lock()
+
+async def build_suggest_index():
+    async with suggest_build_lock:
+        # 読み出し中に届いた更新も構築後に再適用されるよう、読み出し前に構築中とする
+        suggest_index.begin_build()
+        try:
+            await load_suggest_index()
+        except Exception as e:
+            suggest_index.abort_build()
+            logger.error(f"サジェストインデックスの構築に失敗しました: {str(e)}")
+
+async def load_suggest_index():
+    fields = {"_id": 0, "id": 1, "name": 1, "slug": 1}
+    services = await db.services.find({}, {**fields, "review_count": 1, "rating": 1, "rating_overall": 1}).to_list(None)
+    companies = await db.companies.find({}, fields).to_list(None)
+    categories = await db.categories.find({}, fields).to_list(None)
+
+    # 企業・カテゴリはサービス数を人気度とする
+    vendor_counts: Dict[str, int] = {}
+    category_counts: Dict[str, int] = {}
+    async for row in db.services.aggregate([{"$group": {"_id": "$vendor_id", "count": {"$sum": 1}}}]):
+        vendor_counts[row["_id"]] = row["count"]
+    async for row in db.services.aggregate([{"$group": {"_id": "$category_id", "count": {"$sum": 1}}}]):
+        category_counts[row["_id"]] = row["count"]
+
+    entries = [
+        ("service", s, service_popularity(s.get("review_count"), s.get("rating", s.get("rating_overall"))))
+        for s in services
+    ]
+    entries += [("company", c, float(vendor_counts.get(c["id"], 0))) for c in companies]
+    entries += [("category", c, float(category_counts.get(c["id"], 0))) for c in categories]
+    await run_in_executor(suggest_index.build, entries)
+
+# カタログスナップショットの定期更新（DBが正常な間のみ）
+async def refresh_catalog_snapshot():
+    while True:
+        if not database_health.degraded:
+            try:
+                counts = await write_snapshot(db, catalog_snapshot.path)
+                catalog_snapshot.load()
+                logger.info(f"カタログスナップショットを更新しました: {counts}")
+            except Exception as e:
+                logger.error(f"カタログスナップショットの更新に失敗しました: {str(e)}")
+        await asyncio.sleep(CATALOG_SNAPSHOT_INTERVAL)
+
+# サービスに埋め込んだベンダー・カテゴリ情報の整合性チェック
+async def run_snapshot_check():
+    try:
+        await check_snapshots(db)
+    except Exception as e:
+        logger.error(f"スナップショットの整合性チェックに失敗しました: {str(e)}")
+
+# DBに依存する起動処理（インデックス作成・初期ユーザー・インメモリインデックスの構築）
+async def prepare_database():
+    # DBが停止・劣化している間は待機し、各処理がサーバー選択のタイムアウトまで待たされないようにする
+    await database_health.check()
+    while database_health.degraded:
+        await asyncio.sleep(database_health.interval)
+    try:
+        await create_initial_user()
+    except Exception as e:
+        logger.error(f"初期ユーザーの作成に失敗しました: {str(e)}")
+    try:
+        await ensure_price_indexes(db)
+        await backfill_price_fields(db)
+    except Exception as e:
+        logger.error(f"価格インデックスの準備に失敗しました: {str(e)}")
+    try:
+        await ensure_similarity_indexes(db)
+        await ensure_snapshot_indexes(db)
+    except Exception as e:
+        logger.error(f"サービスのインデックス作成に失敗しました: {str(e)}")
+    asyncio.create_task(run_snapshot_check())
+    try:
+        await ensure_article_indexes(db)
+        article_tag_index.build(await db.articles.find({}, ARTICLE_INDEX_FIELDS).to_list(None))
+    except Exception as e:
+        logger.error(f"記事タグインデックスの構築に失敗しました: {str(e)}")
+    try:
+        await ensure_rating_history_indexes(db)
+    except Exception as e:
+        logger.error(f"評価推移コレクションのインデックス作成に失敗しました: {str(e)}")
+    try:
+        await popularity_counter.ensure_indexes()
+    except Exception as e:
+        logger.error(f"人気度コレクションのインデックス作成に失敗しました: {str(e)}")
+    asyncio.create_task(build_suggest_index())
+    asyncio.create_task(build_similarity_index())
+    logger.info("データベースの準備が完了しました")
+
 # 起動イベント
 @app.on_event("startup")
 async def startup_db_client():
-    await create_initial_user()
+    # DBに接続できない状態で起動した場合も前回のスナップショットで閲覧できるよう、
+    # DBを待つ処理はバックグラウンドで行い、起動（リクエストの受付開始）を妨げない
+    catalog_snapshot.load()
+    database_health.start()
+    app.state.snapshot_task = asyncio.create_task(refresh_catalog_snapshot())
+    app.state.prepare_task = asyncio.create_task(prepare_database())
+    popularity_counter.start()
     logger.info("サーバーが起動しました")
 
 # シャットダウンイベント
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.state.snapshot_task.cancel()
+    app.state.prepare_task.cancel()
+    await database_health.stop()
+    await popularity_counter.stop()
     client.close()
     logger.info("データベース接続を閉じました")
 
 # ルーターをアプリケーションに含める
 app.include_router(api_router)
 
+# DB障害時のスナップショット応答（キャッシュヘッダーの付与より内側で処理する）
+app.middleware("http")(degraded_mode_middleware(catalog_snapshot, database_health))
+
+# キャッシュヘッダーの付与
+app.middleware("http")(cache_headers_middleware)
+
 # CORSミドルウェアの追加
 app.add_middleware(
     CORSMiddleware,
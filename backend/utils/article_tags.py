@@ -0,0 +1,126 @@
+"""記事のタグインデックス
+
+タグ→記事IDの逆引きと公開済み記事のタグ別件数をメモリ上に保持し、
+create_article / update_article / delete_article で差分更新する。
+公開日が未来の記事は公開日時を過ぎた時点（次回の件数取得時）に件数へ加える。
+関連記事はタグの重なり数（同数なら公開日の新しい順）で順位付けする。
+"""
+import heapq
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+ARTICLE_INDEX_FIELDS = {"_id": 0, "id": 1, "tags": 1, "published_at": 1}
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    # MongoDBから読み出した日時はタイムゾーンなし（UTC）のため揃える
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _normalize_tags(tags: Optional[Iterable[str]]) -> Set[str]:
+    return {tag.strip() for tag in tags or [] if tag and tag.strip()}
+
+
+async def ensure_article_indexes(db):
+    await db.articles.create_index([("tags", 1), ("published_at", -1)])
+    await db.articles.create_index([("published_at", -1)])
+
+
+class ArticleTagIndex:
+    def __init__(self):
+        self.ready = False
+        self._tag_articles: Dict[str, Set[str]] = {}
+        self._articles: Dict[str, Tuple[Set[str], Optional[datetime]]] = {}
+        # 公開済み（公開日が現在以前）の記事のタグ別件数と、件数に含めた記事
+        self._counts: Counter = Counter()
+        self._counted: Set[str] = set()
+        # 公開予定の記事 (公開日, 記事ID) のヒープ
+        self._scheduled: List[Tuple[datetime, str]] = []
+
+    def build(self, articles: Iterable[Dict[str, Any]]):
+        self._tag_articles = {}
+        self._articles = {}
+        self._counts = Counter()
+        self._counted = set()
+        self._scheduled = []
+        for article in articles:
+            self._add(article)
+        self.ready = True
+        logger.info(f"記事タグインデックスを構築しました: {len(self._articles)}件")
+
+    def _add(self, article: Dict[str, Any]):
+        tags = _normalize_tags(article.get("tags"))
+        published_at = _aware(article.get("published_at"))
+        self._articles[article["id"]] = (tags, published_at)
+        for tag in tags:
+            self._tag_articles.setdefault(tag, set()).add(article["id"])
+        if published_at is None:
+            return
+        if published_at <= datetime.now(timezone.utc):
+            self._count(article["id"])
+        else:
+            heapq.heappush(self._scheduled, (published_at, article["id"]))
+
+    def _count(self, article_id: str):
+        self._counted.add(article_id)
+        self._counts.update(self._articles[article_id][0])
+
+    def _publish_due(self):
+        # 公開日時を過ぎた公開予定の記事を件数に加える（削除・公開日変更済みのものは読み飛ばす）
+        now = datetime.now(timezone.utc)
+        while self._scheduled and self._scheduled[0][0] <= now:
+            published_at, article_id = heapq.heappop(self._scheduled)
+            current = self._articles.get(article_id)
+            if current is not None and current[1] == published_at and article_id not in self._counted:
+                self._count(article_id)
+
+    def remove(self, article_id: str):
+        tags, _ = self._articles.pop(article_id, (set(), None))
+        for tag in tags:
+            members = self._tag_articles.get(tag)
+            if members is not None:
+                members.discard(article_id)
+                if not members:
+                    del self._tag_articles[tag]
+        if article_id in self._counted:
+            self._counted.discard(article_id)
+            self._counts.subtract(tags)
+            for tag in tags:
+                if self._counts[tag] <= 0:
+                    del self._counts[tag]
+
+    def upsert(self, article: Dict[str, Any]):
+        if not article or not article.get("id"):
+            return
+        self.remove(article["id"])
+        self._add(article)
+
+    def tag_counts(self, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """公開済み記事のタグ別件数を多い順に返す"""
+        self._publish_due()
+        return self._counts.most_common(limit)
+
+    def related(self, article_id: str, limit: int = 5) -> List[Tuple[str, int]]:
+        """タグが重なる公開済み記事を (記事ID, 重なり数) の順位順に返す"""
+        tags, _ = self._articles.get(article_id, (set(), None))
+        overlap: Counter = Counter()
+        for tag in tags:
+            for other in self._tag_articles.get(tag, ()):
+                if other != article_id:
+                    overlap[other] += 1
+
+        now = datetime.now(timezone.utc)
+        oldest = datetime.min.replace(tzinfo=timezone.utc)
+        candidates = [
+            (other, count, self._articles[other][1])
+            for other, count in overlap.items()
+            if self._articles[other][1] is not None and self._articles[other][1] <= now
+        ]
+        candidates.sort(key=lambda c: (c[1], c[2] or oldest), reverse=True)
+        return [(other, count) for other, count, _ in candidates[:limit]]
@@ -0,0 +1,320 @@
+"""MongoDB障害時の読み取り専用モード
+
+サービス・カテゴリ・企業・公開済み記事をAPIレスポンスと同じ形で定期的に
+msgpack形式のファイルへ書き出し、読み込み時はメモリマップして必要なレコードだけを
+デコードする。MongoDBのヘルスチェックが失敗するか応答が遅い間は、カタログの
+読み取りAPIをこのスナップショットから返す（``X-Data-Source: snapshot`` を付与）。
+
+ファイル形式: MAGIC | レコード(msgpack)... | フッター(msgpack) | フッター長(8バイト)
+"""
+import os
+import re
+import mmap
+import time
+import struct
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timezone
+
+import msgpack
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pymongo.errors import PyMongoError
+
+from models.service import Service
+from models.category import Category
+from models.company import Company
+from models.article import Article
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"AIHSNAP1"
+FOOTER_LENGTH = struct.Struct("<Q")
+
+# スナップショット対象のコレクション（APIのパス名, レスポンスモデル）
+COLLECTIONS = {
+    "services": Service,
+    "categories": Category,
+    "companies": Company,
+    "articles": Article,
+}
+LIST_ROUTE = re.compile(r"^/api/(?P<collection>services|categories|companies|articles)$")
+DETAIL_ROUTE = re.compile(r"^/api/(?P<collection>services|categories|companies|articles)/(?P<slug>[^/]+)$")
+# スラッグではなく個別のエンドポイントを指すパス
+RESERVED_SLUGS = {"popular", "tags"}
+# DBに依存しないためフォールバック中もそのまま処理するパス
+DB_INDEPENDENT_PATHS = {"/api/health", "/api/suggest", "/api/track", "/api/docs", "/api/openapi.json", "/api/articles/tags"}
+DEFAULT_LIST_LIMIT = 1000
+
+
+def _service_meta(document: Dict[str, Any]) -> list:
+    return [document.get("price_monthly_min"), bool(document.get("has_free_plan"))]
+
+
+def _article_meta(document: Dict[str, Any]) -> list:
+    return [document.get("tags") or [], document.get("published_at")]
+
+
+async def write_snapshot(db, path: Path) -> Dict[str, int]:
+    """DBからカタログを読み出してスナップショットファイルを書き出す
+
+    読み出しのみイベントループで行い、モデルの検証・エンコードとファイルへの
+    書き込み（fsync を含む）はスレッドプールで実行する。
+    """
+    now = datetime.now(timezone.utc)
+    queries = {"articles": {"published_at": {"$lte": now}}}
+    sorts = {"services": [("_id", 1)], "articles": [("published_at", -1)]}
+    documents: Dict[str, List[Dict[str, Any]]] = {}
+    for collection in COLLECTIONS:
+        cursor = db[collection].find(queries.get(collection, {}), {"_id": 0})
+        if collection in sorts:
+            cursor = cursor.sort(sorts[collection])
+        documents[collection] = await cursor.to_list(None)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _write_file, path, documents, now)
+
+
+def _write_file(path: Path, documents: Dict[str, List[Dict[str, Any]]], now: datetime) -> Dict[str, int]:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    footer: Dict[str, Any] = {"generated_at": now.isoformat(), "collections": {}}
+    try:
+        with open(tmp_path, "wb") as f:
+            _write_records(f, documents, footer)
+        os.replace(tmp_path, path)
+    except BaseException:
+        # 書き込み途中のファイルを残さない
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return {name: len(c["offsets"]) for name, c in footer["collections"].items()}
+
+
+def _write_records(f, documents: Dict[str, List[Dict[str, Any]]], footer: Dict[str, Any]):
+    f.write(MAGIC)
+    for collection, model in COLLECTIONS.items():
+        offsets, slugs, meta = [], {}, []
+        for document in documents[collection]:
+            try:
+                record = jsonable_encoder(model(**document))
+            except Exception as e:
+                logger.warning(f"スナップショットに含められないドキュメントをスキップしました: {collection} ({str(e)})")
+                continue
+            packed = msgpack.packb(record, use_bin_type=True)
+            if record.get("slug"):
+                slugs[record["slug"]] = len(offsets)
+            offsets.append((f.tell(), len(packed)))
+            if collection == "services":
+                meta.append(_service_meta(record))
+            elif collection == "articles":
+                meta.append(_article_meta(record))
+            f.write(packed)
+        footer["collections"][collection] = {"offsets": offsets, "slugs": slugs, "meta": meta}
+    packed_footer = msgpack.packb(footer, use_bin_type=True)
+    f.write(packed_footer)
+    f.write(FOOTER_LENGTH.pack(len(packed_footer)))
+    f.flush()
+    os.fsync(f.fileno())
+
+
+class CatalogSnapshot:
+    """メモリマップしたスナップショットからレコードを読み出す"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.generated_at: Optional[datetime] = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._collections: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self._mmap is not None
+
+    def load(self) -> bool:
+        if not self.path.exists():
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if mapped[:len(MAGIC)] != MAGIC:
+                raise ValueError("不正なファイル形式です")
+            (footer_length,) = FOOTER_LENGTH.unpack(mapped[-FOOTER_LENGTH.size:])
+            footer_start = len(mapped) - FOOTER_LENGTH.size - footer_length
+            footer = msgpack.unpackb(mapped[footer_start:footer_start + footer_length], raw=False, strict_map_key=False)
+        except Exception as e:
+            logger.error(f"カタログスナップショットの読み込みに失敗しました: {str(e)}")
+            return False
+        previous = self._mmap
+        self._mmap = mapped
+        self._collections = footer["collections"]
+        self.generated_at = datetime.fromisoformat(footer["generated_at"])
+        if previous is not None:
+            previous.close()
+        return True
+
+    def _record(self, collection: str, index: int) -> Dict[str, Any]:
+        offset, length = self._collections[collection]["offsets"][index]
+        return msgpack.unpackb(self._mmap[offset:offset + length], raw=False)
+
+    def get(self, collection: str, slug: str) -> Optional[Dict[str, Any]]:
+        index = self._collections.get(collection, {}).get("slugs", {}).get(slug)
+        return None if index is None else self._record(collection, index)
+
+    def _service_indexes(self, params) -> List[int]:
+        meta = self._collections["services"]["meta"]
+        indexes = list(range(len(meta)))
+        min_price = params.get("min_price")
+        max_price = params.get("max_price")
+        if min_price is not None:
+            indexes = [i for i in indexes if meta[i][0] is not None and meta[i][0] >= float(min_price)]
+        if max_price is not None:
+            indexes = [i for i in indexes if meta[i][0] is not None and meta[i][0] <= float(max_price)]
+        if params.get("free_only") in ("true", "1"):
+            indexes = [i for i in indexes if meta[i][1]]
+        sort = params.get("sort")
+        if sort in ("price_asc", "price_desc"):
+            # APIと同様に価格未設定（null）は除外し、同額は _id（書き出し順）で並べる
+            indexes = [i for i in indexes if meta[i][0] is not None]
+            indexes.sort(key=lambda i: (meta[i][0], i), reverse=sort == "price_desc")
+        return indexes
+
+    def _article_indexes(self, params) -> List[int]:
+        meta = self._collections["articles"]["meta"]
+        tag = (params.get("tag") or "").strip()
+        return [i for i in range(len(meta)) if not tag or tag in meta[i][0]]
+
+    def list(self, collection: str, params) -> List[Dict[str, Any]]:
+        if collection == "services":
+            indexes = self._service_indexes(params)
+        elif collection == "articles":
+            indexes = self._article_indexes(params)
+        else:
+            indexes = list(range(len(self._collections[collection]["offsets"])))
+        skip = int(params.get("skip", 0))
+        limit = int(params.get("limit", DEFAULT_LIST_LIMIT))
+        return [self._record(collection, i) for i in indexes[skip:skip + limit]]
+
+    def respond(self, request) -> Optional[JSONResponse]:
+        """カタログの読み取りリクエストであればスナップショットからレスポンスを作成する"""
+        if not self.loaded or request.method not in ("GET", "HEAD"):
+            return None
+        path = request.url.path
+        match = LIST_ROUTE.match(path)
+        try:
+            if match:
+                content = self.list(match["collection"], request.query_params)
+            else:
+                match = DETAIL_ROUTE.match(path)
+                if not match or match["slug"] in RESERVED_SLUGS:
+                    return None
+                content = self.get(match["collection"], match["slug"])
+                if content is None:
+                    return JSONResponse(
+                        status_code=404,
+                        content={"detail": f"スラッグ '{match['slug']}' が見つかりません"},
+                        headers=self._headers(),
+                    )
+        except (ValueError, KeyError):
+            return JSONResponse(status_code=400, content={"detail": "パラメーターが不正です"}, headers=self._headers())
+        return JSONResponse(content=content, headers=self._headers())
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "X-Data-Source": "snapshot",
+            "X-Snapshot-Generated-At": self.generated_at.isoformat(),
+            "Warning": '110 - "Response is Stale"',
+        }
+
+
+class DatabaseHealth:
+    """MongoDBへの ping を定期的に行い、失敗または遅延時に劣化状態とみなす
+
+    復旧は連続して ``recovery_checks`` 回正常だった場合に判定する（切り替えのばたつき防止）。
+    """
+
+    def __init__(self, db, interval: float = 5.0, latency_threshold_ms: float = 500.0,
+                 timeout: float = 2.0, recovery_checks: int = 2):
+        self.db = db
+        self.interval = interval
+        self.latency_threshold_ms = latency_threshold_ms
+        self.timeout = timeout
+        self.recovery_checks = recovery_checks
+        self.degraded = False
+        self.latency_ms: Optional[float] = None
+        self._healthy_streak = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def _mark(self, healthy: bool, reason: str = ""):
+        if healthy:
+            self._healthy_streak += 1
+            if self.degraded and self._healthy_streak >= self.recovery_checks:
+                self.degraded = False
+                logger.info("MongoDBが復旧したため通常モードに戻ります")
+        else:
+            self._healthy_streak = 0
+            if not self.degraded:
+                self.degraded = True
+                logger.warning(f"MongoDBの異常を検知したため読み取り専用モードに切り替えます: {reason}")
+
+    def report_failure(self, reason: str):
+        self._mark(False, reason)
+
+    async def check(self):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.db.command("ping"), self.timeout)
+        except Exception as e:
+            self.latency_ms = None
+            self._mark(False, str(e) or type(e).__name__)
+            return
+        self.latency_ms = (time.perf_counter() - start) * 1000
+        if self.latency_ms > self.latency_threshold_ms:
+            self._mark(False, f"応答時間 {self.latency_ms:.0f}ms")
+        else:
+            self._mark(True)
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def degraded_mode_middleware(snapshot: CatalogSnapshot, health: DatabaseHealth):
+    """劣化状態の間、カタログの読み取りをスナップショットから返すミドルウェアを作成する"""
+
+    async def middleware(request, call_next):
+        path = request.url.path
+        if not path.startswith("/api") or path in DB_INDEPENDENT_PATHS:
+            return await call_next(request)
+
+        if not health.degraded:
+            try:
+                return await call_next(request)
+            except PyMongoError as e:
+                health.report_failure(str(e))
+                response = snapshot.respond(request)
+                if response is None:
+                    raise
+                return response
+
+        response = snapshot.respond(request)
+        if response is not None:
+            return response
+        detail = "データベースのメンテナンス中のため、現在は閲覧のみ可能です"
+        return JSONResponse(status_code=503, content={"detail": detail}, headers={"Retry-After": "30"})
+
+    return middleware
@@ -0,0 +1,383 @@
+"""負荷検証用の合成データ生成
+
+本番規模のデータ量（数十万サービス・数百万レビュー）をローカルで再現するための
+ジェネレーター。既存データは削除せず、バッチ単位の insert_many で逐次投入する。
+同じ seed と基準日時を指定すれば同じデータが生成される（投入済みのタグは再投入しない）。
+
+使い方:
+    python -m utils.datagen --categories 300 --services 100000 --reviews 3000000 --seed 42
+"""
+import os
+import sys
+import uuid
+import random
+import asyncio
+import argparse
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+
+from utils.pricing import pricing_fields
+from utils.snapshots import vendor_snapshot, category_snapshot
+from utils.rating_history import COLLECTION as RATING_HISTORY_COLLECTION, GRANULARITIES, bucket_start, rating_increments
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+# 生成する日時の基準（実行日時に依存させないため固定する）
+DEFAULT_REFERENCE_TIME = datetime(2025, 1, 1, tzinfo=timezone.utc)
+# レビューの投稿者（CLIから生成した場合）
+SYNTHETIC_USER_ID = "synthetic-user"
+# IDはタグとスラッグから導出し、seed が同じでもタグが異なれば衝突しないようにする
+ID_NAMESPACE = uuid.UUID("6f1c2a4e-9d3b-4e57-8a21-5b0c7d9e3f14")
+
+# 生成に使う語彙
+CATEGORY_WORDS = [
+    "文章生成", "画像生成", "音声認識", "翻訳", "議事録", "営業支援", "カスタマーサポート",
+    "データ分析", "コード補完", "動画編集", "マーケティング", "人事", "法務", "会計",
+    "検索", "チャットボット", "需要予測", "OCR", "ナレッジ管理", "教育",
+]
+CATEGORY_SUFFIXES = ["AI", "ツール", "プラットフォーム", "SaaS", "アシスタント"]
+COMPANY_PREFIXES = ["ネクスト", "スマート", "クラウド", "ディープ", "オープン", "フューチャー", "ブレイン", "アルファ"]
+COMPANY_SUFFIXES = ["テック", "ラボ", "システムズ", "AI", "ソリューションズ", "ワークス"]
+HQ_LOCATIONS = ["東京都港区", "東京都渋谷区", "大阪府大阪市", "福岡県福岡市", "サンフランシスコ", "ロンドン"]
+SERVICE_SUFFIXES = ["Pro", "Studio", "Assist", "Cloud", "Enterprise", "Lite", "One", "X"]
+PROS = ["操作が直感的", "日本語の精度が高い", "導入が簡単", "API連携が豊富", "サポートが丁寧", "コストパフォーマンスが良い"]
+CONS = ["料金がやや高い", "カスタマイズ性が低い", "英語UIの箇所がある", "処理速度にムラがある", "ドキュメントが少ない"]
+PLAN_NAMES = ["Free", "Starter", "Business", "Enterprise"]
+BILLING_CYCLES = ["monthly", "yearly"]
+REVIEW_TITLES = {
+    1: ["期待外れでした", "使いづらい", "おすすめできません"],
+    2: ["改善の余地あり", "少し物足りない", "価格に見合わない"],
+    3: ["可もなく不可もなく", "普通に使える", "用途次第"],
+    4: ["便利です", "業務効率が上がった", "満足しています"],
+    5: ["手放せないツール", "最高の体験", "導入して正解でした"],
+}
+REVIEW_SENTENCES = [
+    "社内の{category}業務で半年ほど利用しています。",
+    "導入初期は設定に戸惑いましたが、サポートの対応は迅速でした。",
+    "チームメンバーからの評判も上々です。",
+    "料金体系がもう少し分かりやすいと助かります。",
+    "日本語での出力品質は期待以上でした。",
+    "他社サービスと比較したうえで選びました。",
+    "大量のデータを扱うと動作が重くなることがあります。",
+    "API経由で既存システムと連携できる点が決め手でした。",
+]
+AUTHOR_FAMILY_NAMES = ["佐藤", "鈴木", "高橋", "田中", "伊藤", "渡辺", "山本", "中村", "小林", "加藤"]
+AUTHOR_ROLES = ["エンジニア", "マーケター", "営業", "経営者", "デザイナー", "人事担当", "カスタマーサクセス"]
+
+# レビュー評価の分布（実サイトに近い高評価寄り）
+RATING_WEIGHTS = [0.05, 0.07, 0.15, 0.35, 0.38]
+
+
+class DatasetExistsError(ValueError):
+    """同じタグの合成データが投入済みの場合に送出する"""
+
+
+def _uuid(name: str) -> str:
+    return str(uuid.uuid5(ID_NAMESPACE, name))
+
+
+def _timestamp(rng: random.Random, now: datetime, max_days: int = 730) -> datetime:
+    return now - timedelta(seconds=rng.randint(0, max_days * 86400))
+
+
+def generate_categories(rng: random.Random, count: int, tag: str, now: datetime) -> List[Dict[str, Any]]:
+    categories = []
+    for i in range(count):
+        name = f"{rng.choice(CATEGORY_WORDS)}{rng.choice(CATEGORY_SUFFIXES)} {i + 1}"
+        created_at = _timestamp(rng, now)
+        categories.append({
+            "id": _uuid(f"{tag}-category-{i + 1}"),
+            "name": name,
+            "slug": f"{tag}-category-{i + 1}",
+            "icon": rng.choice(["assistant", "sales", "image", "voice", "code", "chart"]),
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+    return categories
+
+
+def generate_companies(rng: random.Random, count: int, tag: str, now: datetime) -> List[Dict[str, Any]]:
+    companies = []
+    for i in range(count):
+        created_at = _timestamp(rng, now)
+        companies.append({
+            "id": _uuid(f"{tag}-company-{i + 1}"),
+            "name": f"{rng.choice(COMPANY_PREFIXES)}{rng.choice(COMPANY_SUFFIXES)} {i + 1}",
+            "slug": f"{tag}-company-{i + 1}",
+            "logo": f"{tag}-company-{i + 1}.png",
+            "founding_year": rng.randint(1995, 2024),
+            "hq_location": rng.choice(HQ_LOCATIONS),
+            "employee_count": int(rng.lognormvariate(4, 1.5)) + 1,
+            "url": f"https://example.com/{tag}/company/{i + 1}",
+            "tagline": f"{rng.choice(CATEGORY_WORDS)}をもっと身近に",
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+    return companies
+
+
+def _pricing_plan(rng: random.Random) -> List[Dict[str, Any]]:
+    plans = []
+    has_free = rng.random() < 0.4
+    base = rng.choice([500, 980, 1500, 2980, 4980, 9800, 30000])
+    for index, plan in enumerate(PLAN_NAMES[0 if has_free else 1:rng.randint(2, 4)]):
+        if plan == "Free":
+            plans.append({"plan": plan, "price_jpy": 0, "billing_cycle": "monthly"})
+            continue
+        cycle = rng.choice(BILLING_CYCLES)
+        price = base * (index + 1) * (10 if cycle == "yearly" else 1)
+        plans.append({"plan": plan, "price_jpy": price, "billing_cycle": cycle})
+    return plans
+
+
+def _review_counts(rng: random.Random, services: int, reviews: int) -> List[int]:
+    # 少数の人気サービスにレビューが集中するロングテール分布
+    weights = [rng.paretovariate(1.2) for _ in range(services)]
+    if not weights:
+        return []
+    total = sum(weights)
+    shares = [reviews * weight / total for weight in weights]
+    counts = [int(share) for share in shares]
+    # 切り捨てで余った件数は端数の大きい順に1件ずつ配分し、合計を reviews に合わせる
+    remainder = reviews - sum(counts)
+    for i in sorted(range(services), key=lambda i: shares[i] - counts[i], reverse=True)[:remainder]:
+        counts[i] += 1
+    return counts
+
+
+def _review_body(rng: random.Random, category_name: str) -> str:
+    sentences = rng.sample(REVIEW_SENTENCES, rng.randint(2, 4))
+    return "".join(sentences).format(category=category_name)
+
+
+def generate_reviews(
+    rng: random.Random,
+    service_slug: str,
+    service_id: str,
+    category_name: str,
+    count: int,
+    quality: float,
+    now: datetime,
+    user_id: str = SYNTHETIC_USER_ID,
+) -> Iterator[Dict[str, Any]]:
+    # サービスごとの品質に応じて分布を高評価側/低評価側へずらす
+    weights = [w * (1 + quality * (star - 3) / 2) for star, w in enumerate(RATING_WEIGHTS, start=1)]
+    weights = [max(w, 0.01) for w in weights]
+    for i in range(count):
+        rating = rng.choices([1, 2, 3, 4, 5], weights=weights)[0]
+        created_at = _timestamp(rng, now)
+        yield {
+            "id": _uuid(f"{service_slug}-review-{i + 1}"),
+            "service_id": service_id,
+            "user_id": user_id,
+            "title": rng.choice(REVIEW_TITLES[rating]),
+            "body": _review_body(rng, category_name),
+            "rating": float(rating),
+            "rating_uiux": float(min(5, max(1, rating + rng.choice([-1, 0, 0, 1])))),
+            "rating_cost": float(min(5, max(1, rating + rng.choice([-1, 0, 0, 1])))),
+            "rating_support": float(min(5, max(1, rating + rng.choice([-1, 0, 0, 1])))),
+            "author_name": f"{rng.choice(AUTHOR_FAMILY_NAMES)}さん",
+            "author_role": rng.choice(AUTHOR_ROLES),
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+
+async def _insert_batches(collection, documents: Iterator[Dict[str, Any]], batch_size: int) -> int:
+    inserted = 0
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            await collection.insert_many(batch, ordered=False)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+        inserted += len(batch)
+    return inserted
+
+
+async def generate_dataset(
+    db,
+    categories: int = 100,
+    companies: int = 500,
+    services: int = 10000,
+    reviews: int = 100000,
+    seed: int = 42,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    tag: Optional[str] = None,
+    reference_time: Optional[datetime] = None,
+    user_id: str = SYNTHETIC_USER_ID,
+) -> Dict[str, int]:
+    """合成データを生成して投入し、コレクションごとの投入件数を返す
+
+    スラッグには ``tag``（省略時は ``syn{seed}``）を前置するため、既存データや
+    別 seed で生成したデータとは衝突しない。同じタグのデータが投入済みの場合は
+    ``DatasetExistsError`` を送出する。日時は ``reference_time``（省略時は
+    ``DEFAULT_REFERENCE_TIME``）から過去へ遡って割り当てる。レビューの投稿者は ``user_id`` とする。
+    """
+    rng = random.Random(seed)
+    tag = tag or f"syn{seed}"
+    now = (reference_time or DEFAULT_REFERENCE_TIME).replace(microsecond=0)
+
+    # 同じタグで再実行すると同じ id・スラッグのドキュメントが重複するため拒否する
+    if await db.categories.find_one({"slug": f"{tag}-category-1"}, {"_id": 1}):
+        raise DatasetExistsError(f"タグ '{tag}' の合成データは投入済みです")
+
+    category_docs = generate_categories(rng, categories, tag, now)
+    company_docs = generate_companies(rng, companies, tag, now)
+    inserted = {
+        "categories": await _insert_batches(db.categories, iter(category_docs), batch_size),
+        "companies": await _insert_batches(db.companies, iter(company_docs), batch_size),
+        "services": 0,
+        "reviews": 0,
+        "rating_buckets": 0,
+    }
+
+    review_counts = _review_counts(rng, services, reviews)
+    service_batch: List[Dict[str, Any]] = []
+    review_batch: List[Dict[str, Any]] = []
+    bucket_operations: List[UpdateOne] = []
+    for i in range(services):
+        category = rng.choice(category_docs)
+        vendor = rng.choice(company_docs)
+        slug = f"{tag}-service-{i + 1}"
+        service_id = _uuid(slug)
+        quality = rng.uniform(-1, 1)
+
+        # レビューを先に生成し、その集計値をサービスの評価と評価推移バケットに反映する
+        rating_sum = 0.0
+        review_count = 0
+        dimension_sums = {"rating_uiux": 0.0, "rating_cost": 0.0, "rating_support": 0.0}
+        buckets: Dict[tuple, Dict[str, float]] = {}
+        for review in generate_reviews(
+            rng, slug, service_id, category["name"], review_counts[i], quality, now, user_id
+        ):
+            rating_sum += review["rating"]
+            review_count += 1
+            for field in dimension_sums:
+                dimension_sums[field] += review[field]
+            for granularity in GRANULARITIES:
+                bucket = buckets.setdefault((granularity, bucket_start(review["created_at"], granularity)), {})
+                for key, value in rating_increments(review).items():
+                    bucket[key] = bucket.get(key, 0) + value
+            review_batch.append(review)
+            if len(review_batch) >= batch_size:
+                await db.reviews.insert_many(review_batch, ordered=False)
+                inserted["reviews"] += len(review_batch)
+                review_batch = []
+        rating_overall = round(rating_sum / review_count, 2) if review_count else 0.0
+        for (granularity, bucket), increments in buckets.items():
+            bucket_operations.append(UpdateOne(
+                {"service_id": service_id, "granularity": granularity, "bucket": bucket},
+                {"$inc": increments},
+                upsert=True,
+            ))
+        if len(bucket_operations) >= batch_size:
+            await db[RATING_HISTORY_COLLECTION].bulk_write(bucket_operations, ordered=False)
+            inserted["rating_buckets"] += len(bucket_operations)
+            bucket_operations = []
+
+        name = f"{vendor['name'].split(' ')[0]} {rng.choice(CATEGORY_WORDS)} {rng.choice(SERVICE_SUFFIXES)} {i + 1}"
+        pricing_plan = _pricing_plan(rng)
+        created_at = _timestamp(rng, now)
+        service_batch.append({
+            "id": service_id,
+            "name": name,
+            "slug": slug,
+            "short_description": f"{category['name']}向けの{rng.choice(CATEGORY_SUFFIXES)}",
+            "long_description": _review_body(rng, category["name"]) * 3,
+            "category_id": category["id"],
+            "pricing_plan": pricing_plan,
+            **pricing_fields(pricing_plan),
+            "vendor": vendor_snapshot(vendor),
+            "category": category_snapshot(category),
+            "vendor_id": vendor["id"],
+            "rating_overall": rating_overall,
+            # update_service_rating と同じ集計値（サジェストの人気度などが参照する）
+            "rating": round(rating_sum / review_count, 2) if review_count else 0,
+            "review_count": review_count,
+            "rating_uiux": round(dimension_sums["rating_uiux"] / review_count, 2) if review_count else 0.0,
+            "rating_cost": round(dimension_sums["rating_cost"] / review_count, 2) if review_count else 0.0,
+            "rating_support": round(dimension_sums["rating_support"] / review_count, 2) if review_count else 0.0,
+            "pros": rng.sample(PROS, rng.randint(1, 3)),
+            "cons": rng.sample(CONS, rng.randint(1, 2)),
+            "hero_image": f"{tag}-service-{i + 1}.jpg",
+            "gallery_images": [],
+            "official_url": f"https://example.com/{tag}/service/{i + 1}",
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+        if len(service_batch) >= batch_size:
+            await db.services.insert_many(service_batch, ordered=False)
+            inserted["services"] += len(service_batch)
+            service_batch = []
+
+    if service_batch:
+        await db.services.insert_many(service_batch, ordered=False)
+        inserted["services"] += len(service_batch)
+    if review_batch:
+        await db.reviews.insert_many(review_batch, ordered=False)
+        inserted["reviews"] += len(review_batch)
+    if bucket_operations:
+        await db[RATING_HISTORY_COLLECTION].bulk_write(bucket_operations, ordered=False)
+        inserted["rating_buckets"] += len(bucket_operations)
+
+    logger.info(f"合成データを投入しました: {inserted}")
+    return inserted
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="負荷検証用の合成データを生成します（既存データは削除しません）")
+    parser.add_argument("--categories", type=int, default=100)
+    parser.add_argument("--companies", type=int, default=500)
+    parser.add_argument("--services", type=int, default=10000)
+    parser.add_argument("--reviews", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--tag", default=None, help="スラッグの接頭辞（省略時は syn<seed>）")
+    parser.add_argument(
+        "--reference-date", type=datetime.fromisoformat, default=None,
+        help="生成する日時の基準（YYYY-MM-DD、省略時は 2025-01-01）",
+    )
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+    if os.environ.get("APP_ENV", "development") == "production":
+        print("本番環境では合成データを生成できません", file=sys.stderr)
+        return 1
+
+    logging.basicConfig(level=logging.INFO)
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017/'))
+    db = client[os.environ.get('DB_NAME', 'ai_hikaku_db')]
+    try:
+        asyncio.run(generate_dataset(
+            db,
+            categories=args.categories,
+            companies=args.companies,
+            services=args.services,
+            reviews=args.reviews,
+            seed=args.seed,
+            batch_size=args.batch_size,
+            tag=args.tag,
+            reference_time=args.reference_date and args.reference_date.replace(tzinfo=timezone.utc),
+        ))
+    except DatasetExistsError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
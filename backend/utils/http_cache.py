@@ -0,0 +1,110 @@
+"""APIレスポンスのキャッシュヘッダーとNginxキャッシュの更新
+
+匿名のGETリクエストにはルートごとの ``Cache-Control`` を付与し、
+Nginx の proxy_cache で数秒間のマイクロキャッシュを行う。
+書き込み時は ``X-Cache-Refresh`` ヘッダー付きでNginxへ該当URLを再取得させ、
+キャッシュを最新のレスポンスに置き換える（標準のNginxにはパージ機能がないため）。
+キャッシュキーはクエリ文字列を含むため、再取得できるのはクエリなしのURLだけである。
+再取得の対象となるルートでもクエリ付きのURLは再取得されないため、有効期間を
+``QUERY_MAX_AGE`` 秒に制限する（検索など再取得しないルートは元から有効期間のみで管理する）。
+"""
+import re
+import asyncio
+import logging
+import urllib.request
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+# (パスの正規表現, max-age秒, 書き込み時に再取得するか)
+CACHE_RULES: List[Tuple[re.Pattern, int, bool]] = [
+    (re.compile(r"^/api/services/popular$"), 60, False),
+    (re.compile(r"^/api/services/(?P<slug>[^/]+)/similar$"), 60, True),
+    (re.compile(r"^/api/services/(?P<slug>[^/]+)/rating-history$"), 60, True),
+    (re.compile(r"^/api/services/(?P<slug>[^/]+)$"), 5, True),
+    (re.compile(r"^/api/services$"), 5, True),
+    (re.compile(r"^/api/categories/(?P<slug>[^/]+)$"), 5, True),
+    (re.compile(r"^/api/categories$"), 5, True),
+    (re.compile(r"^/api/companies/(?P<slug>[^/]+)$"), 5, True),
+    (re.compile(r"^/api/companies$"), 5, True),
+    (re.compile(r"^/api/articles/tags$"), 60, True),
+    (re.compile(r"^/api/articles/(?P<slug>[^/]+)/related$"), 5, False),
+    (re.compile(r"^/api/articles/(?P<slug>[^/]+)$"), 5, True),
+    (re.compile(r"^/api/articles$"), 5, True),
+    (re.compile(r"^/api/reviews/(?P<id>[^/]+)$"), 5, True),
+    (re.compile(r"^/api/reviews$"), 5, True),
+    (re.compile(r"^/api/search$"), 30, False),
+    (re.compile(r"^/api/suggest$"), 30, False),
+]
+
+# 期限切れ後も再検証中・バックエンド障害時に古いキャッシュを返せる時間
+STALE_WHILE_REVALIDATE = 30
+STALE_IF_ERROR = 600
+# 再取得の対象となるルートのうち、クエリ文字列付きのURLの max-age 上限
+QUERY_MAX_AGE = 5
+NO_STORE = "no-store"
+
+
+def cache_max_age(path: str, query: str = "") -> Optional[int]:
+    for pattern, max_age, refreshed in CACHE_RULES:
+        if pattern.match(path):
+            return min(max_age, QUERY_MAX_AGE) if query and refreshed else max_age
+    return None
+
+
+async def cache_headers_middleware(request, call_next):
+    """ルートに応じたキャッシュヘッダーを付与する"""
+    response = await call_next(request)
+    if not request.url.path.startswith("/api") or "cache-control" in response.headers:
+        return response
+
+    max_age = cache_max_age(request.url.path, request.url.query)
+    # 404もキャッシュし、削除後の更新でキャッシュ済みの200を置き換えられるようにする
+    if request.method not in ("GET", "HEAD") or max_age is None or response.status_code not in (200, 404):
+        response.headers["Cache-Control"] = NO_STORE
+    elif "authorization" in request.headers:
+        response.headers["Cache-Control"] = "private, no-store"
+    else:
+        response.headers["Cache-Control"] = (
+            f"public, max-age={max_age}, "
+            f"stale-while-revalidate={STALE_WHILE_REVALIDATE}, stale-if-error={STALE_IF_ERROR}"
+        )
+    return response
+
+
+class CachePurger:
+    """書き込み後にNginxのキャッシュを最新の内容で置き換える
+
+    ``base_url`` が未設定の場合（Nginxを経由しない開発環境など）は何もしない。
+    """
+
+    def __init__(self, base_url: Optional[str], timeout: float = 5.0):
+        self.base_url = (base_url or "").rstrip("/")
+        self.timeout = timeout
+        self._tasks = set()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url)
+
+    def _refresh(self, paths: List[str]):
+        for path in paths:
+            request = urllib.request.Request(self.base_url + path, headers={"X-Cache-Refresh": "1"})
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    response.read()
+            except Exception as e:
+                # 404等も再取得としては成功しているため、接続エラーのみ記録する
+                if not hasattr(e, "code"):
+                    logger.warning(f"キャッシュの更新に失敗しました: {path} ({str(e)})")
+
+    def purge(self, paths: Iterable[str]):
+        """指定したパス（クエリ文字列なし）のキャッシュ更新をバックグラウンドで実行する"""
+        paths = sorted({quote(path, safe="/") for path in paths if path})
+        if not self.enabled or not paths:
+            return
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(None, self._refresh, paths)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
@@ -0,0 +1,159 @@
+"""サービスの閲覧・クリック数のバッファリング集計
+
+リクエストごとに書き込むとホットパスに負荷がかかるため、カウントはメモリ上で
+サービスIDごとに集計し、数秒おきに1回の unordered bulk_write で
+時間別・日別のバケットドキュメントへ $inc する。
+"""
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "service_popularity"
+DEFAULT_FLUSH_INTERVAL = 5.0
+# メモリ上に保持する (サービスID, イベント) の上限（超えた分は破棄する）
+DEFAULT_MAX_KEYS = 50000
+# 時間別バケットの保持期間
+HOURLY_RETENTION = timedelta(days=30)
+
+# イベント種別と保存先フィールドの対応
+EVENT_FIELDS = {"view": "views", "click": "clicks"}
+
+
+def bucket_starts(now: datetime) -> Dict[str, datetime]:
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    return {"hour": hour, "day": hour.replace(hour=0)}
+
+
+class PopularityCounter:
+    def __init__(self, db, flush_interval: float = DEFAULT_FLUSH_INTERVAL, max_keys: int = DEFAULT_MAX_KEYS):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        self.dropped = 0
+        self._counts: Counter = Counter()
+        # 前回の書き込みで失敗した操作（次回の書き込みでそのまま再送する）
+        self._retry: List[UpdateOne] = []
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def record(self, service_id: str, event: str, count: int = 1):
+        """イベントをメモリ上で加算する（DBへの書き込みは行わない）"""
+        key = (service_id, event)
+        if key not in self._counts and len(self._counts) >= self.max_keys:
+            self.dropped += count
+            return
+        self._counts[key] += count
+
+    def _operations(self, counts: Dict[Tuple[str, str], int], now: datetime):
+        per_service: Dict[str, Dict[str, int]] = {}
+        for (service_id, event), count in counts.items():
+            fields = per_service.setdefault(service_id, {})
+            fields[EVENT_FIELDS[event]] = fields.get(EVENT_FIELDS[event], 0) + count
+
+        operations = []
+        for granularity, bucket in bucket_starts(now).items():
+            for service_id, increments in per_service.items():
+                operations.append(UpdateOne(
+                    {"service_id": service_id, "granularity": granularity, "bucket": bucket},
+                    {"$inc": increments, "$set": {"updated_at": now}},
+                    upsert=True,
+                ))
+        return operations
+
+    async def flush(self):
+        """溜まったカウントをまとめて書き込む"""
+        async with self._flush_lock:
+            if not self._counts and not self._retry:
+                return
+            counts, self._counts = self._counts, Counter()
+            try:
+                # 存在しないサービスIDのバケットを作らないよう、書き込み前に1回の $in で検証する
+                counts = await self._known(counts)
+            except Exception as e:
+                # まだ何も書き込んでいないため、カウントを戻して次回に再試行する
+                self._counts.update(counts)
+                logger.error(f"人気度カウンターのサービスID検証に失敗しました: {str(e)}")
+                return
+            operations = self._retry + self._operations(counts, datetime.now(timezone.utc))
+            self._retry = []
+            try:
+                if operations:
+                    await self.db[COLLECTION].bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # unordered のため成功した操作を再送すると二重に加算される。
+                # 失敗した操作だけを次回に持ち越す（上限を超える分は破棄）
+                failed = [operations[error["index"]] for error in e.details.get("writeErrors", [])]
+                self._retry = failed[:self.max_keys]
+                self.dropped += len(failed) - len(self._retry)
+                logger.error(f"人気度カウンターの書き込みに一部失敗しました: {len(failed)}件を再送します")
+            except Exception as e:
+                # タイムアウト等は一部が書き込まれた可能性があり、再送すると二重に加算されるため破棄する
+                logger.error(f"人気度カウンターの書き込みに失敗したため {len(operations)}件の更新を破棄しました: {str(e)}")
+            if self.dropped:
+                logger.warning(f"人気度カウンターの上限を超えたため {self.dropped}件のイベントを破棄しました")
+                self.dropped = 0
+
+    async def _known(self, counts: Dict[Tuple[str, str], int]) -> Dict[Tuple[str, str], int]:
+        service_ids = list({service_id for service_id, _ in counts})
+        if not service_ids:
+            return counts
+        cursor = self.db.services.find({"id": {"$in": service_ids}}, {"id": 1})
+        known = {service["id"] async for service in cursor}
+        unknown = [key for key in counts if key[0] not in known]
+        if unknown:
+            logger.warning(f"存在しないサービスIDのイベント {len(unknown)}種類を破棄しました")
+        return {key: count for key, count in counts.items() if key[0] in known}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def ensure_indexes(self):
+        collection = self.db[COLLECTION]
+        await collection.create_index([("service_id", 1), ("granularity", 1), ("bucket", 1)], unique=True)
+        await collection.create_index([("granularity", 1), ("bucket", 1)])
+        await collection.create_index(
+            "updated_at",
+            expireAfterSeconds=int(HOURLY_RETENTION.total_seconds()),
+            partialFilterExpression={"granularity": "hour"},
+        )
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """定期書き込みを停止し、残りのカウントを書き込む"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def top_services(self, days: int = 7, limit: int = 20, event: str = "view"):
+        """直近 ``days`` 日間の日別バケットを合計し、(サービスID, 件数) を多い順に返す"""
+        field = EVENT_FIELDS[event]
+        since = bucket_starts(datetime.now(timezone.utc))["day"] - timedelta(days=days - 1)
+        pipeline = [
+            {"$match": {"granularity": "day", "bucket": {"$gte": since}}},
+            {"$group": {"_id": "$service_id", "count": {"$sum": f"${field}"}}},
+            {"$match": {"count": {"$gt": 0}}},
+            {"$sort": {"count": -1}},
+            # 削除済み・未知のサービスIDが上位を占めて件数が減らないよう、$limit の前に除外する
+            {"$lookup": {"from": "services", "localField": "_id", "foreignField": "id", "as": "service"}},
+            {"$match": {"service": {"$ne": []}}},
+            {"$limit": limit},
+            {"$project": {"count": 1}},
+        ]
+        return [(row["_id"], row["count"]) async for row in self.db[COLLECTION].aggregate(pipeline)]
@@ -0,0 +1,146 @@
+"""料金プランの月額換算と価格インデックス用フィールド
+
+``Service.pricing_plan`` は請求周期がプランごとに異なるため、月額（円）に正規化した
+最小・最大価格と無料プランの有無をサービスのドキュメントに保持し、並び替えと
+価格帯での絞り込みをインデックスで処理できるようにする。
+
+既存ドキュメントへの反映:
+    python -m utils.pricing
+"""
+import os
+import sys
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# 請求周期ごとの月数
+BILLING_CYCLE_MONTHS = {
+    "monthly": 1,
+    "month": 1,
+    "quarterly": 3,
+    "yearly": 12,
+    "year": 12,
+    "annual": 12,
+    "annually": 12,
+}
+
+PRICE_FIELDS = ("price_monthly_min", "price_monthly_max", "has_free_plan")
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _plan_value(plan: Any, key: str, default: Any = None) -> Any:
+    if isinstance(plan, dict):
+        return plan.get(key, default)
+    return getattr(plan, key, default)
+
+
+def monthly_prices(pricing_plan: Optional[Iterable[Any]]) -> List[float]:
+    """各プランの価格を月額（円）に換算したリストを返す"""
+    prices = []
+    for plan in pricing_plan or []:
+        cycle = str(_plan_value(plan, "billing_cycle", "monthly") or "monthly").lower()
+        months = BILLING_CYCLE_MONTHS.get(cycle, 1)
+        prices.append(round((_plan_value(plan, "price_jpy", 0) or 0) / months, 2))
+    return prices
+
+
+def pricing_fields(pricing_plan: Optional[Iterable[Any]]) -> Dict[str, Any]:
+    """サービスに保存する価格インデックス用フィールドを計算する"""
+    prices = monthly_prices(pricing_plan)
+    if not prices:
+        return {"price_monthly_min": None, "price_monthly_max": None, "has_free_plan": False}
+    return {
+        "price_monthly_min": min(prices),
+        "price_monthly_max": max(prices),
+        "has_free_plan": min(prices) == 0,
+    }
+
+
+def price_query(
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    free_only: bool = False,
+    priced_only: bool = False,
+) -> Dict[str, Any]:
+    """月額の価格帯条件を MongoDB のクエリに変換する
+
+    ``max_price`` は最安プランの月額が指定額以下のサービス、``min_price`` は
+    最安プランの月額が指定額以上のサービスに一致する。``priced_only`` の場合は
+    価格未設定のサービスを除外する（価格順の並び替えで先頭に来ないようにするため）。
+    """
+    query: Dict[str, Any] = {}
+    price_range: Dict[str, float] = {}
+    if min_price is not None:
+        price_range["$gte"] = min_price
+    if max_price is not None:
+        price_range["$lte"] = max_price
+    if priced_only and not price_range:
+        price_range["$ne"] = None
+    if price_range:
+        query["price_monthly_min"] = price_range
+    if free_only:
+        query["has_free_plan"] = True
+    return query
+
+
+# 並び替えキーと MongoDB のソート指定の対応
+# 同額のサービスが多いため _id で順序を確定させ、skip/limit のページ間で重複・欠落しないようにする。
+# 降順は _id も降順にしてインデックスを逆順に走査できるようにする
+PRICE_SORTS = {
+    "price_asc": [("price_monthly_min", 1), ("_id", 1)],
+    "price_desc": [("price_monthly_min", -1), ("_id", -1)],
+}
+DEFAULT_SORT = [("_id", 1)]
+
+
+async def ensure_price_indexes(db):
+    await db.services.create_index([("price_monthly_min", 1), ("_id", 1)])
+    await db.services.create_index([("has_free_plan", 1), ("price_monthly_min", 1), ("_id", 1)])
+
+
+async def backfill_price_fields(db, only_missing: bool = True, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """既存サービスの価格インデックス用フィールドを一括で更新し、更新件数を返す"""
+    query = {"price_monthly_min": {"$exists": False}} if only_missing else {}
+    updated = 0
+    operations = []
+    async for service in db.services.find(query, {"_id": 1, "pricing_plan": 1}):
+        operations.append(UpdateOne({"_id": service["_id"]}, {"$set": pricing_fields(service.get("pricing_plan"))}))
+        if len(operations) >= batch_size:
+            result = await db.services.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+            operations = []
+    if operations:
+        result = await db.services.bulk_write(operations, ordered=False)
+        updated += result.modified_count
+    if updated:
+        logger.info(f"価格インデックス用フィールドを更新しました: {updated}件")
+    return updated
+
+
+def main() -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+    logging.basicConfig(level=logging.INFO)
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017/'))
+    db = client[os.environ.get('DB_NAME', 'ai_hikaku_db')]
+
+    async def run():
+        await ensure_price_indexes(db)
+        await backfill_price_fields(db, only_missing=False)
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""サービス評価の推移（月別・週別バケット）
+
+レビューの作成・更新・削除時に、レビュー投稿日が属する月・週のバケットへ件数と
+評価の合計（総合・UI/UX・コスト・サポート）を $inc で差分反映する。
+推移グラフはバケットを読むだけで描画でき、レビュー件数に依存しない。
+
+全件の再集計:
+    python -m utils.rating_history [--service-id <ID>]
+"""
+import os
+import sys
+import asyncio
+import argparse
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "service_rating_history"
+GRANULARITIES = ("month", "week")
+# レビューの評価項目とバケットのフィールド接頭辞
+DIMENSIONS = {"rating_uiux": "uiux", "rating_cost": "cost", "rating_support": "support"}
+
+
+def _utc(value: Optional[datetime]) -> datetime:
+    # MongoDBから読み出した日時はタイムゾーンなし（UTC）のため揃える
+    if value is None:
+        return datetime.now(timezone.utc)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def bucket_start(value: Optional[datetime], granularity: str) -> datetime:
+    """日時が属するバケットの開始日時（月初／週の月曜日 0時 UTC）を返す"""
+    day = _utc(value).replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "month":
+        return day.replace(day=1)
+    return day - timedelta(days=day.weekday())
+
+
+def rating_increments(review: Dict[str, Any], sign: int = 1) -> Dict[str, float]:
+    """レビュー1件分のバケットへの加算値を返す（sign=-1 で取り消し）"""
+    increments = {"count": sign, "rating_sum": sign * float(review.get("rating") or 0)}
+    for field, prefix in DIMENSIONS.items():
+        if review.get(field) is not None:
+            increments[f"{prefix}_sum"] = sign * float(review[field])
+            increments[f"{prefix}_count"] = sign
+    return increments
+
+
+def _merge(target: Dict[str, float], increments: Dict[str, float]):
+    for key, value in increments.items():
+        target[key] = target.get(key, 0) + value
+
+
+def bucket_operations(service_id: str, created_at: Optional[datetime], increments: Dict[str, float]) -> List[UpdateOne]:
+    increments = {key: value for key, value in increments.items() if value}
+    if not increments:
+        return []
+    return [
+        UpdateOne(
+            {"service_id": service_id, "granularity": granularity, "bucket": bucket_start(created_at, granularity)},
+            {"$inc": increments},
+            upsert=True,
+        )
+        for granularity in GRANULARITIES
+    ]
+
+
+async def apply_review_change(db, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]):
+    """レビューの作成（old=None）・更新・削除（new=None）をバケットへ反映する"""
+    review = new or old
+    increments: Dict[str, float] = {}
+    if old:
+        _merge(increments, rating_increments(old, -1))
+    if new:
+        _merge(increments, rating_increments(new, 1))
+    operations = bucket_operations(review["service_id"], review.get("created_at"), increments)
+    if operations:
+        await db[COLLECTION].bulk_write(operations, ordered=False)
+
+
+async def ensure_rating_history_indexes(db, collection: str = COLLECTION):
+    await db[collection].create_index([("service_id", 1), ("granularity", 1), ("bucket", 1)], unique=True)
+
+
+def summarize(bucket: Dict[str, Any]) -> Dict[str, Any]:
+    """バケットをAPIレスポンス用の平均値に変換する"""
+    count = bucket.get("count", 0)
+    summary = {
+        "bucket": bucket["bucket"],
+        "count": count,
+        "average": round(bucket.get("rating_sum", 0) / count, 2) if count else None,
+    }
+    for prefix in DIMENSIONS.values():
+        dimension_count = bucket.get(f"{prefix}_count", 0)
+        summary[f"average_{prefix}"] = (
+            round(bucket.get(f"{prefix}_sum", 0) / dimension_count, 2) if dimension_count else None
+        )
+    return summary
+
+
+def _rebuild_pipeline(granularity: str, query: Dict[str, Any], into: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """レビューをバケット単位に集計して ``into`` へ $merge する集計パイプライン"""
+    unit = {"unit": "month"} if granularity == "month" else {"unit": "week", "startOfWeek": "monday"}
+    group: Dict[str, Any] = {
+        "_id": {
+            "service_id": "$service_id",
+            "bucket": {"$dateTrunc": {"date": "$created_at", "timezone": "UTC", **unit}},
+        },
+        "count": {"$sum": 1},
+        "rating_sum": {"$sum": {"$ifNull": ["$rating", 0]}},
+    }
+    for field, prefix in DIMENSIONS.items():
+        # rating_increments と同様に値が設定されているレビューだけを数える（null・未設定は除く）
+        group[f"{prefix}_sum"] = {"$sum": {"$ifNull": [f"${field}", 0]}}
+        group[f"{prefix}_count"] = {"$sum": {"$cond": [{"$gt": [f"${field}", None]}, 1, 0]}}
+    return [
+        {"$match": {**query, "created_at": {"$type": "date"}}},
+        {"$group": group},
+        {"$project": {
+            "_id": 0,
+            "service_id": "$_id.service_id",
+            "granularity": {"$literal": granularity},
+            "bucket": "$_id.bucket",
+            **{key: 1 for key in group if key != "_id"},
+        }},
+        {"$merge": into},
+    ]
+
+
+async def rebuild_rating_history(db, service_id: Optional[str] = None) -> int:
+    """レビューからバケットを再集計して置き換え、作成したバケット数を返す
+
+    集計はサーバー側（$group / $dateTrunc、MongoDB 5.0以降）で行い、結果をアプリケーションに
+    読み出さない。全件の再集計は一時コレクションへ書き出してから現行のコレクションと
+    差し替えるため、集計中も推移APIは既存のバケットを返し続ける。ただし集計開始後に
+    書き込まれたレビューの差分は差し替えで失われ得るため、書き込みの少ない時間帯に実行する。
+    """
+    if service_id:
+        # 1サービス分は現行のコレクションへ一意キーで置き換え、集計対象外になったバケットを削除する
+        rebuilt_at = datetime.now(timezone.utc)
+        into = {
+            "into": COLLECTION,
+            "on": ["service_id", "granularity", "bucket"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }
+        for granularity in GRANULARITIES:
+            pipeline = _rebuild_pipeline(granularity, {"service_id": service_id}, into)
+            pipeline.insert(-1, {"$addFields": {"rebuilt_at": rebuilt_at}})
+            await db.reviews.aggregate(pipeline).to_list(None)
+        await db[COLLECTION].delete_many({"service_id": service_id, "rebuilt_at": {"$ne": rebuilt_at}})
+        count = await db[COLLECTION].count_documents({"service_id": service_id})
+        logger.info(f"評価推移バケットを再集計しました: {service_id} {count}件")
+        return count
+
+    staging = db[f"{COLLECTION}_rebuild"]
+    await staging.drop()
+    await ensure_rating_history_indexes(db, staging.name)
+    for granularity in GRANULARITIES:
+        await db.reviews.aggregate(_rebuild_pipeline(granularity, {}, {"into": staging.name})).to_list(None)
+    count = await staging.count_documents({})
+    await staging.rename(COLLECTION, dropTarget=True)
+    logger.info(f"評価推移バケットを再集計しました: {count}件")
+    return count
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="レビューから評価推移バケットを再集計します")
+    parser.add_argument("--service-id", default=None, help="指定したサービスのみ再集計する")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+    logging.basicConfig(level=logging.INFO)
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017/'))
+    db = client[os.environ.get('DB_NAME', 'ai_hikaku_db')]
+
+    async def run():
+        await ensure_rating_history_indexes(db)
+        await rebuild_rating_history(db, args.service_id)
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+"""類似サービス推薦用のインメモリベクトルインデックス
+
+各サービスをテキスト（文字バイグラムのハッシュ特徴量）・カテゴリ・ベンダー・価格帯の
+ベクトルに変換し、コサイン類似度の上位 k 件を事前計算して保持する。
+サービスの作成・更新・削除時は該当行と影響を受ける近傍だけを再計算する。
+"""
+import math
+import zlib
+import logging
+import threading
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.pricing import monthly_prices
+
+logger = logging.getLogger(__name__)
+
+TEXT_DIM = 512
+CATEGORY_DIM = 64
+VENDOR_DIM = 64
+PRICE_BUCKETS = 8
+DEFAULT_TOP_K = 10
+BUILD_BLOCK_SIZE = 1024
+# 1ブロックあたりの作業メモリの上限。類似度(float32) と argpartition 用の
+# 符号反転コピー(float32)・インデックス(int64) で1要素あたり16バイト使う
+BUILD_BLOCK_BYTES = 64 * 1024 * 1024
+BYTES_PER_SCORE = 16
+
+# 特徴量ブロックごとの重み（各ブロックを正規化した後に掛ける）
+TEXT_WEIGHT = 0.6
+CATEGORY_WEIGHT = 0.25
+VENDOR_WEIGHT = 0.1
+PRICE_WEIGHT = 0.05
+
+def build_block_size(n: int) -> int:
+    """サービス数 n に対して作業メモリが ``BUILD_BLOCK_BYTES`` に収まる行数"""
+    return max(1, min(BUILD_BLOCK_SIZE, BUILD_BLOCK_BYTES // (max(n, 1) * BYTES_PER_SCORE)))
+
+
+def _hash(token: str, dim: int) -> int:
+    return zlib.crc32(token.encode("utf-8")) % dim
+
+
+def _price_bucket(pricing_plan: Iterable[Dict[str, Any]]) -> Optional[int]:
+    prices = [p for p in monthly_prices(pricing_plan) if p > 0]
+    if not prices:
+        return 0 if pricing_plan else None
+    # 100円未満〜100万円超を対数スケールで区切る
+    bucket = int(math.log10(min(prices))) - 1
+    return max(1, min(PRICE_BUCKETS - 1, bucket))
+
+
+def service_text(service: Dict[str, Any]) -> str:
+    parts = [
+        service.get("short_description") or "",
+        service.get("long_description") or "",
+        " ".join(service.get("pros") or []),
+        " ".join(service.get("cons") or []),
+    ]
+    return unicodedata.normalize("NFKC", " ".join(parts)).lower()
+
+
+def vectorize(service: Dict[str, Any]) -> np.ndarray:
+    """サービスのドキュメントを正規化済みの特徴ベクトルに変換する"""
+    vector = np.zeros(TEXT_DIM + CATEGORY_DIM + VENDOR_DIM + PRICE_BUCKETS, dtype=np.float32)
+
+    # テキスト: 空白を除いた文字バイグラムの対数TF（日本語は分かち書き不要）
+    text = "".join(service_text(service).split())
+    counts = Counter(text[i:i + 2] for i in range(len(text) - 1))
+    text_block = vector[:TEXT_DIM]
+    for token, count in counts.items():
+        text_block[_hash(token, TEXT_DIM)] += 1.0 + math.log(count)
+    norm = np.linalg.norm(text_block)
+    if norm > 0:
+        text_block *= TEXT_WEIGHT / norm
+
+    offset = TEXT_DIM
+    if service.get("category_id"):
+        vector[offset + _hash(service["category_id"], CATEGORY_DIM)] = CATEGORY_WEIGHT
+    offset += CATEGORY_DIM
+    if service.get("vendor_id"):
+        vector[offset + _hash(service["vendor_id"], VENDOR_DIM)] = VENDOR_WEIGHT
+    offset += VENDOR_DIM
+
+    # 価格帯: 隣接する価格帯にも重みを分け、近い価格ほど類似度が高くなるようにする
+    bucket = _price_bucket(service.get("pricing_plan") or [])
+    if bucket is not None:
+        price_block = vector[offset:offset + PRICE_BUCKETS]
+        price_block[bucket] = 1.0
+        if bucket > 0:
+            price_block[bucket - 1] = 0.5
+        if bucket < PRICE_BUCKETS - 1:
+            price_block[bucket + 1] = 0.5
+        price_block *= PRICE_WEIGHT / np.linalg.norm(price_block)
+
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+async def ensure_similarity_indexes(db):
+    # 類似サービスAPIはスラッグで対象を引き、近傍をIDでまとめて取得する
+    await db.services.create_index([("slug", 1)])
+    await db.services.create_index([("id", 1)])
+
+
+class SimilarityIndex:
+    """サービスIDごとの類似サービス上位 k 件を保持するインデックス
+
+    ``build`` は全件の類似度をブロック単位の行列積で計算し、``upsert`` / ``remove`` も
+    近傍の再計算で全件との行列積になり得るため、いずれもイベントループを塞がないよう
+    スレッドプールから呼び出す。DBからの読み出し前に ``begin_build`` を
+    呼ぶと、それ以降に届いた更新を構築完了時に新しいインデックスへ再適用する。
+    """
+
+    def __init__(self, top_k: int = DEFAULT_TOP_K):
+        self.top_k = top_k
+        self.ready = False
+        self._building = False
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, Any]] = []
+        self._reset(0)
+
+    def _reset(self, capacity: int):
+        dim = TEXT_DIM + CATEGORY_DIM + VENDOR_DIM + PRICE_BUCKETS
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._active = np.zeros(capacity, dtype=bool)
+        self._neighbor_rows = np.full((capacity, self.top_k), -1, dtype=np.int32)
+        self._neighbor_scores = np.full((capacity, self.top_k), -np.inf, dtype=np.float32)
+        self._row_ids: List[Optional[str]] = []
+        self._id_rows: Dict[str, int] = {}
+        self._free_rows: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._id_rows)
+
+    def __contains__(self, service_id: str) -> bool:
+        return service_id in self._id_rows
+
+    def _top_k(self, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # scores: (rows, n) の類似度行列から行ごとに上位 k 件を取り出す
+        k = min(self.top_k, scores.shape[1])
+        rows = np.full((scores.shape[0], self.top_k), -1, dtype=np.int32)
+        values = np.full((scores.shape[0], self.top_k), -np.inf, dtype=np.float32)
+        if k == 0:
+            return rows, values
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        part_scores = np.take_along_axis(scores, part, axis=1)
+        order = np.argsort(-part_scores, axis=1)
+        top_rows = np.take_along_axis(part, order, axis=1)
+        top_scores = np.take_along_axis(part_scores, order, axis=1)
+        valid = np.isfinite(top_scores)
+        rows[:, :k] = np.where(valid, top_rows, -1)
+        values[:, :k] = np.where(valid, top_scores, -np.inf)
+        return rows, values
+
+    def _recompute(self, rows: np.ndarray):
+        n = len(self._row_ids)
+        matrix = self._matrix[:n]
+        block_size = build_block_size(n)
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            scores = matrix[block] @ matrix.T
+            scores[:, ~self._active[:n]] = -np.inf
+            scores[np.arange(len(block)), block] = -np.inf
+            self._neighbor_rows[block], self._neighbor_scores[block] = self._top_k(scores)
+
+    def begin_build(self):
+        """再構築の開始を記録し、以降の更新を構築完了時の再適用のために保持する"""
+        with self._lock:
+            self._building = True
+
+    def abort_build(self):
+        """再構築が失敗した場合に保持していた更新を破棄する"""
+        with self._lock:
+            self._building = False
+            self._pending = []
+
+    def build(self, services: Iterable[Dict[str, Any]]):
+        """全サービスからインデックスを再構築する（ブロッキング処理）"""
+        self.begin_build()
+        services = [s for s in services if s.get("id")]
+
+        # 重い計算は別インスタンス上で行い、ロックは差し替え時のみ取得する
+        staging = SimilarityIndex(self.top_k)
+        staging._reset(max(len(services), 1))
+        for row, service in enumerate(services):
+            staging._matrix[row] = vectorize(service)
+            staging._row_ids.append(service["id"])
+            staging._id_rows[service["id"]] = row
+        staging._active[:len(services)] = True
+        staging._recompute(np.arange(len(services)))
+
+        with self._lock:
+            for name in ("_matrix", "_active", "_neighbor_rows", "_neighbor_scores", "_row_ids", "_id_rows", "_free_rows"):
+                setattr(self, name, getattr(staging, name))
+            pending, self._pending = self._pending, []
+            for op, payload in pending:
+                if op == "upsert":
+                    self._upsert(payload)
+                else:
+                    self._remove(payload)
+            self._building = False
+            self.ready = True
+        logger.info(f"類似サービスインデックスを構築しました: {len(services)}件")
+
+    def _allocate_row(self, service_id: str) -> int:
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._row_ids[row] = service_id
+        else:
+            row = len(self._row_ids)
+            if row >= len(self._matrix):
+                self._grow(max(row * 2, 16))
+            self._row_ids.append(service_id)
+        self._id_rows[service_id] = row
+        return row
+
+    def _grow(self, capacity: int):
+        old = len(self._matrix)
+        self._matrix = np.vstack([self._matrix, np.zeros((capacity - old, self._matrix.shape[1]), dtype=np.float32)])
+        self._active = np.concatenate([self._active, np.zeros(capacity - old, dtype=bool)])
+        self._neighbor_rows = np.vstack([self._neighbor_rows, np.full((capacity - old, self.top_k), -1, dtype=np.int32)])
+        self._neighbor_scores = np.vstack([self._neighbor_scores, np.full((capacity - old, self.top_k), -np.inf, dtype=np.float32)])
+
+    def _upsert(self, service: Dict[str, Any]):
+        row = self._id_rows.get(service["id"])
+        if row is None:
+            row = self._allocate_row(service["id"])
+        self._matrix[row] = vectorize(service)
+        self._active[row] = True
+
+        n = len(self._row_ids)
+        scores = self._matrix[:n] @ self._matrix[row]
+        scores[~self._active[:n]] = -np.inf
+        scores[row] = -np.inf
+
+        # この行を近傍に含んでいたサービスはスコアが下がり得るため全体を再計算する
+        contains = (self._neighbor_rows[:n] == row).any(axis=1)
+        contains[row] = True
+        # それ以外は k 番目のスコアを上回った場合だけ挿入する
+        improves = (scores > self._neighbor_scores[:n, -1]) & ~contains
+        for other in np.nonzero(improves)[0]:
+            rows = np.append(self._neighbor_rows[other], row)
+            values = np.append(self._neighbor_scores[other], scores[other])
+            order = np.argsort(-values)[:self.top_k]
+            self._neighbor_rows[other] = rows[order]
+            self._neighbor_scores[other] = values[order]
+        self._recompute(np.nonzero(contains)[0])
+
+    def _remove(self, service_id: str):
+        row = self._id_rows.pop(service_id, None)
+        if row is None:
+            return
+        self._active[row] = False
+        self._matrix[row] = 0
+        self._neighbor_rows[row] = -1
+        self._neighbor_scores[row] = -np.inf
+        self._row_ids[row] = None
+        self._free_rows.append(row)
+        n = len(self._row_ids)
+        self._recompute(np.nonzero((self._neighbor_rows[:n] == row).any(axis=1))[0])
+
+    def upsert(self, service: Dict[str, Any]):
+        """サービスの作成・更新をインデックスに反映する"""
+        if not service or not service.get("id"):
+            return
+        with self._lock:
+            if self._building:
+                self._pending.append(("upsert", service))
+            if self.ready:
+                self._upsert(service)
+
+    def remove(self, service_id: str):
+        """削除されたサービスをインデックスから取り除く"""
+        with self._lock:
+            if self._building:
+                self._pending.append(("remove", service_id))
+            if self.ready:
+                self._remove(service_id)
+
+    def neighbors(self, service_id: str, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """事前計算済みの類似サービスを (サービスID, 類似度) の降順で返す"""
+        row = self._id_rows.get(service_id)
+        if row is None:
+            return []
+        limit = min(limit or self.top_k, self.top_k)
+        result = []
+        # 更新はロックを取らずに読むため、スレッドプールで削除された直後の行は読み飛ばす
+        for other, score in zip(self._neighbor_rows[row][:limit], self._neighbor_scores[row][:limit]):
+            if other < 0:
+                break
+            if self._row_ids[other] is not None:
+                result.append((self._row_ids[other], float(score)))
+        return result
@@ -0,0 +1,125 @@
+"""サービスに埋め込むベンダー・カテゴリのスナップショット
+
+一覧表示で企業・カテゴリを別途取得しなくて済むよう、サービスのドキュメントに
+ベンダー名・ロゴとカテゴリ名・アイコンを複製して保持する。
+企業・カテゴリの更新時は update_many で該当サービスへ一括反映し、
+取りこぼしは整合性チェックで修復する。
+
+整合性チェック:
+    python -m utils.snapshots
+"""
+import os
+import sys
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+VENDOR_SNAPSHOT_FIELDS = ("name", "logo")
+CATEGORY_SNAPSHOT_FIELDS = ("name", "icon")
+
+
+def vendor_snapshot(company: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not company:
+        return None
+    return {field: company.get(field) for field in VENDOR_SNAPSHOT_FIELDS}
+
+
+def category_snapshot(category: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not category:
+        return None
+    return {field: category.get(field) for field in CATEGORY_SNAPSHOT_FIELDS}
+
+
+def snapshot_changed(update: Dict[str, Any], fields) -> bool:
+    return any(field in update for field in fields)
+
+
+async def ensure_snapshot_indexes(db):
+    await db.services.create_index([("vendor_id", 1)])
+    await db.services.create_index([("category_id", 1)])
+
+
+async def attach_snapshots(db, service: Dict[str, Any]):
+    """vendor_id / category_id に対応するスナップショットを設定する"""
+    if "vendor_id" in service:
+        company = await db.companies.find_one({"id": service["vendor_id"]}, {"name": 1, "logo": 1})
+        service["vendor"] = vendor_snapshot(company)
+    if "category_id" in service:
+        category = await db.categories.find_one({"id": service["category_id"]}, {"name": 1, "icon": 1})
+        service["category"] = category_snapshot(category)
+
+
+async def fan_out_company(db, company: Optional[Dict[str, Any]], company_id: str) -> int:
+    """企業の変更を、その企業をベンダーとする全サービスへ反映する"""
+    snapshot = vendor_snapshot(company)
+    result = await db.services.update_many(
+        {"vendor_id": company_id, "vendor": {"$ne": snapshot}},
+        {"$set": {"vendor": snapshot}},
+    )
+    return result.modified_count
+
+
+async def fan_out_category(db, category: Optional[Dict[str, Any]], category_id: str) -> int:
+    """カテゴリの変更を、そのカテゴリに属する全サービスへ反映する"""
+    snapshot = category_snapshot(category)
+    result = await db.services.update_many(
+        {"category_id": category_id, "category": {"$ne": snapshot}},
+        {"$set": {"category": snapshot}},
+    )
+    return result.modified_count
+
+
+async def check_snapshots(db) -> Dict[str, int]:
+    """全企業・カテゴリについてスナップショットのずれを検出して修復し、修復件数を返す"""
+    repaired = {"vendor": 0, "category": 0}
+    known_companies = []
+    async for company in db.companies.find({}, {"_id": 0, "id": 1, "name": 1, "logo": 1}):
+        known_companies.append(company["id"])
+        repaired["vendor"] += await fan_out_company(db, company, company["id"])
+    known_categories = []
+    async for category in db.categories.find({}, {"_id": 0, "id": 1, "name": 1, "icon": 1}):
+        known_categories.append(category["id"])
+        repaired["category"] += await fan_out_category(db, category, category["id"])
+
+    # 削除済みの企業・カテゴリを参照しているサービスはスナップショットを外す
+    result = await db.services.update_many(
+        {"vendor_id": {"$nin": known_companies}, "vendor": {"$ne": None}},
+        {"$set": {"vendor": None}},
+    )
+    repaired["vendor"] += result.modified_count
+    result = await db.services.update_many(
+        {"category_id": {"$nin": known_categories}, "category": {"$ne": None}},
+        {"$set": {"category": None}},
+    )
+    repaired["category"] += result.modified_count
+
+    if repaired["vendor"] or repaired["category"]:
+        logger.warning(f"サービスのスナップショットを修復しました: {repaired}")
+    return repaired
+
+
+def main() -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+    logging.basicConfig(level=logging.INFO)
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017/'))
+    db = client[os.environ.get('DB_NAME', 'ai_hikaku_db')]
+
+    async def run():
+        await ensure_snapshot_indexes(db)
+        print(await check_snapshots(db))
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""入力補完（サジェスト）用のインメモリ前方一致インデックス
+
+サービス・企業・カテゴリの名前とスラッグを正規化したキーのソート済み配列に保持し、
+二分探索で前方一致範囲を求める。一致件数が ``SCAN_LIMIT`` を超えるプレフィックスは
+長さにかかわらず上位候補を事前に計算しておくため、検索時の走査は常に
+``SCAN_LIMIT`` 件以下に収まる。
+
+正規化: NFKC（全角/半角の統一）、小文字化、カタカナ→ひらがな。
+かなを含む名前はローマ字表記のキーも登録するため、「ちゃっと」「チャット」「chatto」の
+いずれでも一致する（漢字の読みは辞書を持たないため対象外）。
+"""
+import heapq
+import logging
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_SUGGESTIONS = 20
+# 前方一致範囲がこの件数を超えるプレフィックスは上位候補を事前に計算して保持する
+SCAN_LIMIT = 256
+
+ROMAJI = {
+    "あ": "a", "い": "i", "う": "u", "え": "e", "お": "o",
+    "か": "ka", "き": "ki", "く": "ku", "け": "ke", "こ": "ko",
+    "さ": "sa", "し": "shi", "す": "su", "せ": "se", "そ": "so",
+    "た": "ta", "ち": "chi", "つ": "tsu", "て": "te", "と": "to",
+    "な": "na", "に": "ni", "ぬ": "nu", "ね": "ne", "の": "no",
+    "は": "ha", "ひ": "hi", "ふ": "fu", "へ": "he", "ほ": "ho",
+    "ま": "ma", "み": "mi", "む": "mu", "め": "me", "も": "mo",
+    "や": "ya", "ゆ": "yu", "よ": "yo",
+    "ら": "ra", "り": "ri", "る": "ru", "れ": "re", "ろ": "ro",
+    "わ": "wa", "を": "wo", "ん": "n",
+    "が": "ga", "ぎ": "gi", "ぐ": "gu", "げ": "ge", "ご": "go",
+    "ざ": "za", "じ": "ji", "ず": "zu", "ぜ": "ze", "ぞ": "zo",
+    "だ": "da", "ぢ": "ji", "づ": "zu", "で": "de", "ど": "do",
+    "ば": "ba", "び": "bi", "ぶ": "bu", "べ": "be", "ぼ": "bo",
+    "ぱ": "pa", "ぴ": "pi", "ぷ": "pu", "ぺ": "pe", "ぽ": "po",
+    "ゔ": "vu", "ぁ": "a", "ぃ": "i", "ぅ": "u", "ぇ": "e", "ぉ": "o",
+    "ゃ": "ya", "ゅ": "yu", "ょ": "yo", "ゎ": "wa",
+}
+# 拗音（きゃ等）はまとめて変換する
+YOUON = {"ゃ": "a", "ゅ": "u", "ょ": "o"}
+YOUON_SPECIAL = {"し": "sh", "ち": "ch", "じ": "j"}
+# 外来語表記（てぃ、ふぁ等）
+SMALL_VOWELS = {"ぁ": "a", "ぃ": "i", "ぅ": "u", "ぇ": "e", "ぉ": "o"}
+SMALL_VOWEL_BASES = {"て": "t", "で": "d", "ふ": "f", "ゔ": "v", "う": "w", "し": "sh", "ち": "ch", "じ": "j"}
+
+
+def normalize(text: str) -> str:
+    """全角/半角・大文字/小文字・カタカナ/ひらがなの違いを吸収する"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = "".join(chr(ord(c) - 0x60) if "ァ" <= c <= "ヶ" else c for c in text)
+    return " ".join(text.split())
+
+
+def to_romaji(text: str) -> str:
+    """ひらがなをヘボン式ローマ字に変換する（かな以外の文字はそのまま）"""
+    result = []
+    geminate = False
+    i = 0
+    while i < len(text):
+        c = text[i]
+        following = text[i + 1] if i + 1 < len(text) else ""
+        if c == "っ":
+            geminate = True
+            i += 1
+            continue
+        if c == "ー":
+            if result and result[-1]:
+                result.append(result[-1][-1])
+            i += 1
+            continue
+        if following in YOUON and c in ROMAJI and c not in YOUON:
+            if c in YOUON_SPECIAL:
+                syllable = YOUON_SPECIAL[c] + YOUON[following]
+            else:
+                syllable = ROMAJI[c][:-1] + "y" + YOUON[following]
+            i += 2
+        elif following in SMALL_VOWELS and c in SMALL_VOWEL_BASES:
+            syllable = SMALL_VOWEL_BASES[c] + SMALL_VOWELS[following]
+            i += 2
+        else:
+            syllable = ROMAJI.get(c, c)
+            i += 1
+        if geminate and syllable and syllable[0] not in "aiueon":
+            syllable = ("t" if syllable.startswith("ch") else syllable[0]) + syllable
+        geminate = False
+        result.append(syllable)
+    return "".join(result)
+
+
+def service_popularity(review_count: Any, rating: Any) -> float:
+    """サービスの人気度（レビュー数を主、評価を従とする）"""
+    return float(review_count or 0) + float(rating or 0) / 10
+
+
+def _has_kana(text: str) -> bool:
+    return any("ぁ" <= c <= "ゖ" or c == "ー" for c in text)
+
+
+def index_keys(name: str, slug: Optional[str]) -> List[str]:
+    """エントリを登録する正規化済みキーの一覧を返す"""
+    keys = set()
+    if slug:
+        keys.add(normalize(slug))
+    for value in (normalize(name), normalize((slug or "").replace("-", " "))):
+        if not value:
+            continue
+        variants = [value]
+        if _has_kana(value):
+            variants.append(to_romaji(value))
+        for variant in variants:
+            keys.add(variant)
+            keys.add(variant.replace(" ", ""))
+            # 2語目以降からの前方一致も拾う（「enterprise」で「ChatGPT Enterprise」）
+            for i, c in enumerate(variant):
+                if c == " " and i + 1 < len(variant):
+                    keys.add(variant[i + 1:])
+    return sorted(keys)
+
+
+class SuggestIndex:
+    """名前・スラッグの前方一致で候補を返すインデックス
+
+    前方一致範囲が広いプレフィックスの上位候補は構築時に計算してキャッシュし、
+    書き込み時はキャッシュを破棄せず該当エントリの順位だけを差分更新する。
+    DBからの読み出し前に ``begin_build`` を呼ぶと、それ以降に届いた更新を
+    構築完了時に新しいインデックスへ再適用する。
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._building = False
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, tuple]] = []
+        self._keys: List[Tuple[str, str]] = []
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._entry_keys: Dict[str, List[str]] = {}
+        self._cache: Dict[str, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _entry_key(kind: str, entry_id: str) -> str:
+        return f"{kind}:{entry_id}"
+
+    def begin_build(self):
+        """再構築の開始を記録し、以降の更新を構築完了時の再適用のために保持する"""
+        with self._lock:
+            self._building = True
+
+    def abort_build(self):
+        """再構築が失敗した場合に保持していた更新を破棄する"""
+        with self._lock:
+            self._building = False
+            self._pending = []
+
+    def build(self, entries: Iterable[Tuple[str, Dict[str, Any], float]]):
+        """(種別, ドキュメント, 人気度) の一覧からインデックスを再構築する（ブロッキング処理）"""
+        self.begin_build()
+
+        staging = SuggestIndex()
+        for kind, document, popularity in entries:
+            entry_key = self._entry_key(kind, document["id"])
+            staging._entries[entry_key] = self._make_entry(kind, document, popularity)
+            staging._entry_keys[entry_key] = index_keys(document.get("name", ""), document.get("slug"))
+            staging._keys.extend((key, entry_key) for key in staging._entry_keys[entry_key])
+        staging._keys.sort()
+        staging._warm("", 0, len(staging._keys))
+
+        with self._lock:
+            self._keys = staging._keys
+            self._entries = staging._entries
+            self._entry_keys = staging._entry_keys
+            self._cache = staging._cache
+            pending, self._pending = self._pending, []
+            for op, args in pending:
+                getattr(self, op)(*args)
+            self._building = False
+            self.ready = True
+        logger.info(f"サジェストインデックスを構築しました: {len(self._entries)}件")
+
+    @staticmethod
+    def _make_entry(kind: str, document: Dict[str, Any], popularity: float) -> Dict[str, Any]:
+        return {
+            "type": kind,
+            "id": document["id"],
+            "name": document.get("name", ""),
+            "slug": document.get("slug"),
+            "popularity": popularity,
+        }
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        lo = bisect_left(self._keys, (prefix,))
+        hi = bisect_left(self._keys, (prefix + "\U0010ffff",))
+        return lo, hi
+
+    def _rank(self, entry_keys: Iterable[str]) -> List[str]:
+        return heapq.nsmallest(
+            MAX_SUGGESTIONS,
+            set(entry_keys),
+            key=lambda k: (-self._entries[k]["popularity"], len(self._entries[k]["name"]), self._entries[k]["name"]),
+        )
+
+    def _children(self, lo: int, hi: int, depth: int) -> Tuple[List[str], List[Tuple[str, int, int]]]:
+        """共通プレフィックスが depth 文字の範囲を、キーが一致するエントリと次の1文字ごとの範囲に分ける"""
+        terminal: List[str] = []
+        ranges: List[Tuple[str, int, int]] = []
+        i = lo
+        while i < hi:
+            key, entry_key = self._keys[i]
+            if len(key) == depth:
+                terminal.append(entry_key)
+                i += 1
+                continue
+            child = key[:depth + 1]
+            j = bisect_left(self._keys, (child + "\U0010ffff",), i, hi)
+            ranges.append((child, i, j))
+            i = j
+        return terminal, ranges
+
+    def _rank_prefix(self, prefix: str, lo: int, hi: int) -> List[str]:
+        """プレフィックスの上位候補を計算する
+
+        一致件数が多い場合は1文字長いプレフィックスのキャッシュ済み上位候補を併合する
+        （子の上位候補に入らないエントリは親でも上位に入らない）。
+        """
+        if hi - lo <= SCAN_LIMIT:
+            return self._rank(entry_key for _, entry_key in self._keys[lo:hi])
+        candidates, ranges = self._children(lo, hi, len(prefix))
+        for child, child_lo, child_hi in ranges:
+            cached = self._cache.get(child)
+            candidates.extend(cached if cached is not None else (k for _, k in self._keys[child_lo:child_hi]))
+        return self._rank(candidates)
+
+    def _warm(self, prefix: str, lo: int, hi: int):
+        # 一致件数が SCAN_LIMIT を超えるプレフィックスを長い順（子から親へ）にキャッシュする
+        if hi - lo <= SCAN_LIMIT:
+            return
+        for child, child_lo, child_hi in self._children(lo, hi, len(prefix))[1]:
+            self._warm(child, child_lo, child_hi)
+        if prefix:
+            self._cache[prefix] = self._rank_prefix(prefix, lo, hi)
+
+    def _refresh_cache(self, entry_key: str, old_keys: List[str], new_keys: List[str], demoted: bool):
+        # エントリのキーの各プレフィックスについて、キャッシュ済みの上位候補を差分更新する。
+        # 再計算で子のキャッシュを併合するため、長いプレフィックスから順に処理する
+        old_prefixes = {key[:i] for key in old_keys for i in range(1, len(key) + 1)}
+        new_prefixes = {key[:i] for key in new_keys for i in range(1, len(key) + 1)}
+        for prefix in sorted(old_prefixes | new_prefixes, key=len, reverse=True):
+            lo, hi = self._range(prefix)
+            ranked = self._cache.get(prefix)
+            if hi - lo <= SCAN_LIMIT:
+                self._cache.pop(prefix, None)
+                continue
+            matches = prefix in new_prefixes
+            if ranked is None or (entry_key in ranked and (demoted or not matches)):
+                # 一致件数が上限を超えた、または順位が下がった・一致しなくなった場合は
+                # 圏外の候補が繰り上がるため再計算する
+                self._cache[prefix] = self._rank_prefix(prefix, lo, hi)
+            elif matches:
+                self._cache[prefix] = self._rank(ranked + [entry_key])
+
+    def _remove_keys(self, entry_key: str) -> List[str]:
+        removed = self._entry_keys.pop(entry_key, [])
+        for key in removed:
+            position = bisect_left(self._keys, (key, entry_key))
+            if position < len(self._keys) and self._keys[position] == (key, entry_key):
+                del self._keys[position]
+        return removed
+
+    def _upsert(self, kind: str, document: Dict[str, Any], popularity: Optional[float] = None):
+        entry_key = self._entry_key(kind, document["id"])
+        previous = self._entries.get(entry_key)
+        if popularity is None:
+            popularity = previous["popularity"] if previous else 0.0
+        old_keys = self._remove_keys(entry_key)
+        new_keys = index_keys(document.get("name", ""), document.get("slug"))
+        self._entries[entry_key] = self._make_entry(kind, document, popularity)
+        self._entry_keys[entry_key] = new_keys
+        for key in new_keys:
+            insort(self._keys, (key, entry_key))
+        demoted = previous is not None and (
+            popularity < previous["popularity"] or self._entries[entry_key]["name"] != previous["name"]
+        )
+        self._refresh_cache(entry_key, old_keys, new_keys, demoted)
+
+    def _set_popularity(self, kind: str, entry_id: str, popularity: float):
+        entry_key = self._entry_key(kind, entry_id)
+        entry = self._entries.get(entry_key)
+        if entry and entry["popularity"] != popularity:
+            demoted = popularity < entry["popularity"]
+            entry["popularity"] = popularity
+            keys = self._entry_keys.get(entry_key, [])
+            self._refresh_cache(entry_key, keys, keys, demoted)
+
+    def _remove(self, kind: str, entry_id: str):
+        entry_key = self._entry_key(kind, entry_id)
+        old_keys = self._remove_keys(entry_key)
+        if self._entries.pop(entry_key, None) is not None:
+            self._refresh_cache(entry_key, old_keys, [], True)
+
+    def _apply(self, op: str, *args):
+        with self._lock:
+            if self._building:
+                self._pending.append((op, args))
+            if self.ready:
+                getattr(self, op)(*args)
+
+    def upsert(self, kind: str, document: Dict[str, Any], popularity: Optional[float] = None):
+        """エントリを登録または更新する（人気度を省略した場合は既存の値を引き継ぐ）"""
+        if not document or not document.get("id"):
+            return
+        self._apply("_upsert", kind, document, popularity)
+
+    def set_popularity(self, kind: str, entry_id: str, popularity: float):
+        self._apply("_set_popularity", kind, entry_id, popularity)
+
+    def remove(self, kind: str, entry_id: str):
+        self._apply("_remove", kind, entry_id)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """前方一致する候補を人気度の高い順に返す"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        ranked = self._cache.get(prefix)
+        if ranked is None:
+            # キャッシュがないプレフィックスの一致件数は SCAN_LIMIT 以下
+            lo, hi = self._range(prefix)
+            ranked = self._rank(entry_key for _, entry_key in self._keys[lo:hi])
+        return [self._entries[k] for k in ranked[:limit]]
@@ -1,10 +1,10 @@
 // 記事関連APIの一元化
 import apiClient from './client';
 
-// 記事一覧の取得
-export const getArticles = async () => {
+// 記事一覧の取得（tag, include_unpublished, skip, limit で絞り込み。include_unpublished は編集者・管理者のみ）
+export const getArticles = async (params = {}) => {
   try {
-    const response = await apiClient.get('/articles');
+    const response = await apiClient.get('/articles', { params });
     return response.data;
   } catch (error) {
     console.error('記事一覧の取得に失敗しました:', error);
@@ -55,3 +55,25 @@ export const deleteArticle = async (articleId) => {
     throw error;
   }
 };
+
+// 関連記事の取得（タグの重なり順）
+export const getRelatedArticles = async (slug, limit = 5) => {
+  try {
+    const response = await apiClient.get(`/articles/${slug}/related`, { params: { limit } });
+    return response.data;
+  } catch (error) {
+    console.error(`記事「${slug}」の関連記事の取得に失敗しました:`, error);
+    throw error;
+  }
+};
+
+// タグ別の公開記事数の取得
+export const getArticleTags = async () => {
+  try {
+    const response = await apiClient.get('/articles/tags');
+    return response.data.tags;
+  } catch (error) {
+    console.error('記事タグの取得に失敗しました:', error);
+    throw error;
+  }
+};
@@ -1,10 +1,10 @@
 // サービス関連APIの一元化
 import apiClient from './client';
 
-// サービス一覧の取得
-export const getServices = async () => {
+// サービス一覧の取得（sort: price_asc/price_desc, min_price/max_price: 月額円, free_only）
+export const getServices = async (params = {}) => {
   try {
-    const response = await apiClient.get('/services');
+    const response = await apiClient.get('/services', { params });
     return response.data;
   } catch (error) {
     console.error('サービス一覧の取得に失敗しました:', error);
@@ -55,3 +55,34 @@ export const deleteService = async (serviceId) => {
     throw error;
   }
 };
+
+// 入力補完候補の取得（サービス・企業・カテゴリ）
+export const getSuggestions = async (query, limit = 10) => {
+  try {
+    const response = await apiClient.get('/suggest', { params: { q: query, limit } });
+    return response.data.suggestions;
+  } catch (error) {
+    console.error('入力補完候補の取得に失敗しました:', error);
+    throw error;
+  }
+};
+
+// 閲覧・比較クリックの記録（失敗しても画面表示には影響させない）
+export const trackServiceEvent = async (serviceId, event = 'view') => {
+  try {
+    await apiClient.post('/track', { service_id: serviceId, event });
+  } catch (error) {
+    console.error(`サービス「${serviceId}」のイベント記録に失敗しました:`, error);
+  }
+};
+
+// 人気サービスの取得（event: view/click）
+export const getPopularServices = async (params = {}) => {
+  try {
+    const response = await apiClient.get('/services/popular', { params });
+    return response.data;
+  } catch (error) {
+    console.error('人気サービスの取得に失敗しました:', error);
+    throw error;
+  }
+};
@@ -5,6 +5,10 @@ import { Star } from '@phosphor-icons/react';
 const ServiceCard = ({ service }) => {
   // サービスが存在しない場合の処理
   if (!service) return null;
+
+  // サービスに埋め込まれたカテゴリ・ベンダー情報を優先して使用
+  const categoryName = service.category?.name || service.category_name;
+  const vendorName = service.vendor?.name || service.vendor_name;
   
   // レーティングスターの生成
   const renderRatingStars = (rating) => {
@@ -44,9 +48,9 @@ const ServiceCard = ({ service }) => {
         )}
         
         {/* カテゴリーバッジ */}
-        {service.category_name && (
+        {categoryName && (
           <div className="absolute top-3 left-3 bg-primary text-white text-xs px-2 py-1 rounded-full">
-            {service.category_name}
+            {categoryName}
           </div>
         )}
       </div>
@@ -54,8 +58,8 @@ const ServiceCard = ({ service }) => {
       {/* カードコンテンツ */}
       <div className="p-5">
         {/* 会社名 */}
-        {service.vendor_name && (
-          <div className="text-sm text-neutral-600 mb-1">{service.vendor_name}</div>
+        {vendorName && (
+          <div className="text-sm text-neutral-600 mb-1">{vendorName}</div>
         )}
         
         {/* サービス名 */}
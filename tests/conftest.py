@@ -0,0 +1,7 @@
+import os
+import sys
+from pathlib import Path
+
+# server.py と同様に backend/ をインポートパスに追加する
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+
+ADMIN = {"id": "admin", "username": "admin", "role": "admin"}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    db = AsyncMongoMockClient()["test"]
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server.popularity_counter, "db", db)
+    monkeypatch.setattr(server.database_health, "db", db)
+    monkeypatch.setattr(server.database_health, "degraded", False)
+    monkeypatch.setattr(server.catalog_snapshot, "path", tmp_path / "catalog.msgpack")
+    server.app.dependency_overrides[server.get_current_user] = lambda: ADMIN
+    with TestClient(server.app) as test_client:
+        yield test_client
+    server.app.dependency_overrides.clear()
+
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = predicate()
+        if result:
+            return result
+        time.sleep(0.05)
+    raise AssertionError("タイムアウトしました")
+
+
+def seed(client, **params):
+    params = {"categories": 3, "companies": 4, "services": 30, "reviews": 200, "seed": 1, **params}
+    response = client.post("/api/seed/synthetic", params=params)
+    assert response.status_code == 201
+    return response.json()["inserted"]
+
+
+def test_synthetic_seed_rejects_same_seed(client):
+    seed(client)
+    assert client.post("/api/seed/synthetic", params={"categories": 3, "seed": 1}).status_code == 409
+
+
+def test_similar_services_after_seed(client):
+    seed(client)
+    slug = client.get("/api/services", params={"limit": 1}).json()[0]["slug"]
+
+    def similar_services():
+        response = client.get(f"/api/services/{slug}/similar", params={"limit": 3})
+        return response.status_code == 200 and response.json()
+
+    similar = wait_for(similar_services)
+    assert len(similar) == 3
+    assert slug not in [service["slug"] for service in similar]
+
+
+def test_price_sort_pages_do_not_overlap(client):
+    seed(client, services=60)
+    unpriced = asyncio.run(server.db.services.find_one({}))
+    asyncio.run(server.db.services.update_one(
+        {"_id": unpriced["_id"]}, {"$set": {"price_monthly_min": None, "has_free_plan": None}}
+    ))
+    pages = [
+        client.get("/api/services", params={"sort": "price_asc", "skip": skip, "limit": 7}).json()
+        for skip in range(0, 70, 7)
+    ]
+    slugs = [service["slug"] for page in pages for service in page]
+    assert len(slugs) == len(set(slugs)) == 59
+    assert unpriced["slug"] not in slugs
+    prices = [service["price_monthly_min"] for page in pages for service in page]
+    assert prices == sorted(prices)
+
+    asyncio.run(server.write_snapshot(server.db, server.catalog_snapshot.path))
+    server.catalog_snapshot.load()
+    for sort in ("price_asc", "price_desc"):
+        api = client.get("/api/services", params={"sort": sort, "limit": 100}).json()
+        snapshot = server.catalog_snapshot.list("services", {"sort": sort, "limit": 100})
+        assert [s["slug"] for s in snapshot] == [s["slug"] for s in api]
+
+
+def test_suggest_after_seed(client):
+    seed(client)
+    service = client.get("/api/services", params={"limit": 1}).json()[0]
+
+    def suggestions():
+        response = client.get("/api/suggest", params={"q": service["slug"]})
+        return response.json()["suggestions"]
+
+    assert service["id"] in [suggestion["id"] for suggestion in wait_for(suggestions)]
+
+
+def test_cache_headers(client):
+    response = client.get("/api/services")
+    assert response.headers["cache-control"].startswith("public, max-age=5,")
+    response = client.get("/api/services", headers={"Authorization": "Bearer token"})
+    assert response.headers["cache-control"] == "private, no-store"
+    assert client.post("/api/track", json={}).headers["cache-control"] == "no-store"
+
+
+def test_track_accepts_seeded_service(client):
+    seed(client)
+    service = client.get("/api/services", params={"limit": 1}).json()[0]
+    response = client.post("/api/track", json={"service_id": service["id"], "event": "view"})
+    assert response.status_code == 202
+    wait_for(lambda: server.similarity_index.ready)
+    response = client.post("/api/track", json={"service_id": "junk", "event": "view"})
+    assert response.status_code == 404
+
+
+def test_startup_does_not_wait_for_unreachable_database(tmp_path, monkeypatch):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    db = AsyncIOMotorClient("mongodb://127.0.0.1:1/")["test"]
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server.popularity_counter, "db", db)
+    monkeypatch.setattr(server.database_health, "db", db)
+    monkeypatch.setattr(server.database_health, "timeout", 0.5)
+    monkeypatch.setattr(server.catalog_snapshot, "path", tmp_path / "catalog.msgpack")
+    started = time.monotonic()
+    with TestClient(server.app) as test_client:
+        assert time.monotonic() - started < 1.0
+        assert wait_for(lambda: test_client.get("/api/health").json()["status"] == "degraded")
+        assert test_client.get("/api/reviews").status_code == 503
+    server.database_health.degraded = False
+
+
+def test_rating_history(client):
+    seed(client)
+    service = client.get("/api/services", params={"limit": 1}).json()[0]
+    history = client.get(f"/api/services/{service['slug']}/rating-history", params={"limit": 60}).json()
+    reviews = client.get("/api/reviews", params={"service_id": service["id"]}).json()
+    assert reviews
+    assert sum(bucket["count"] for bucket in history["buckets"]) == len(reviews)
+    assert client.get(f"/api/services/{service['slug']}/rating-history", params={"granularity": "day"}).status_code == 422
+
+
+def test_edit_and_delete_seeded_review(client):
+    seed(client)
+    review = client.get("/api/reviews").json()[0]
+    stored = asyncio.run(server.db.reviews.find_one({"id": review["id"]}))
+    assert stored["user_id"] == ADMIN["id"]
+    response = client.put(f"/api/reviews/{review['id']}", json={"rating": 1})
+    assert response.status_code == 200
+    assert response.json()["rating"] == 1
+    assert client.delete(f"/api/reviews/{review['id']}").status_code == 204
+
+
+def test_article_feed_hides_unpublished_articles(client):
+    now = datetime.now(timezone.utc)
+    for slug, published_at in (("live", now - timedelta(days=1)), ("draft", None), ("scheduled", now + timedelta(days=1))):
+        article = {"title": slug, "slug": slug, "body": "", "cover_image": "", "tags": ["ai"], "published_at": published_at}
+        assert client.post("/api/articles", json=jsonable_encoder(article)).status_code == 200
+
+    assert [a["slug"] for a in client.get("/api/articles", params={"tag": " ai "}).json()] == ["live"]
+    assert client.get("/api/articles", params={"include_unpublished": True}).status_code == 401
+
+    server.app.dependency_overrides[server.get_optional_user] = lambda: {**ADMIN, "role": "user"}
+    assert client.get("/api/articles", params={"include_unpublished": True}).status_code == 403
+    server.app.dependency_overrides[server.get_optional_user] = lambda: {**ADMIN, "role": "editor"}
+    response = client.get("/api/articles", params={"tag": "ai", "include_unpublished": True})
+    assert sorted(a["slug"] for a in response.json()) == ["draft", "live", "scheduled"]
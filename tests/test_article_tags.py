@@ -0,0 +1,54 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from utils.article_tags import ArticleTagIndex
+
+NOW = datetime.now(timezone.utc)
+
+
+def article(article_id, tags, published_at):
+    return {"id": article_id, "tags": tags, "published_at": published_at}
+
+
+def test_counts_only_published_articles():
+    index = ArticleTagIndex()
+    index.build([
+        article("a", ["ai", "llm"], NOW - timedelta(days=2)),
+        article("b", ["ai"], NOW - timedelta(days=1)),
+        article("c", ["ai"], NOW + timedelta(days=1)),
+        article("d", ["ai"], None),
+    ])
+    assert dict(index.tag_counts()) == {"ai": 2, "llm": 1}
+
+
+def test_scheduled_article_is_counted_after_publication():
+    index = ArticleTagIndex()
+    index.build([article("a", ["ai"], NOW - timedelta(days=1))])
+    index.upsert(article("b", [" ai ", "news"], datetime.now(timezone.utc) + timedelta(milliseconds=50)))
+    assert dict(index.tag_counts()) == {"ai": 1}
+    time.sleep(0.1)
+    assert dict(index.tag_counts()) == {"ai": 2, "news": 1}
+
+
+def test_rescheduled_and_removed_articles():
+    index = ArticleTagIndex()
+    index.build([article("a", ["ai"], NOW - timedelta(days=1))])
+    index.upsert(article("b", ["ai"], NOW - timedelta(seconds=1)))
+    assert dict(index.tag_counts()) == {"ai": 2}
+    # 公開済みの記事を非公開に戻す・削除する
+    index.upsert(article("b", ["ai"], NOW + timedelta(days=1)))
+    assert dict(index.tag_counts()) == {"ai": 1}
+    index.remove("a")
+    assert index.tag_counts() == []
+
+
+def test_related_ranks_by_overlap_then_recency():
+    index = ArticleTagIndex()
+    index.build([
+        article("a", ["ai", "llm", "rag"], NOW - timedelta(days=3)),
+        article("b", ["ai", "llm"], NOW - timedelta(days=2)),
+        article("c", ["ai"], NOW - timedelta(days=1)),
+        article("d", ["ai", "llm", "rag"], NOW + timedelta(days=1)),
+        article("e", ["ai"], NOW - timedelta(days=5)),
+    ])
+    assert index.related("a") == [("b", 2), ("c", 1), ("e", 1)]
@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from utils import catalog_snapshot
+from utils.catalog_snapshot import CatalogSnapshot, write_snapshot
+
+
+def test_write_and_load_snapshot(tmp_path):
+    db = AsyncMongoMockClient()["test"]
+    asyncio.run(db.categories.insert_one({"id": "k1", "name": "チャット", "slug": "chat", "description": "", "icon": "chat"}))
+    path = tmp_path / "catalog.msgpack"
+    counts = asyncio.run(write_snapshot(db, path))
+    assert counts == {"services": 0, "categories": 1, "companies": 0, "articles": 0}
+    snapshot = CatalogSnapshot(path)
+    assert snapshot.load()
+    assert snapshot.get("categories", "chat")["name"] == "チャット"
+
+
+def test_failed_write_leaves_no_temporary_file(tmp_path, monkeypatch):
+    def fail(f, documents, footer):
+        f.write(b"partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(catalog_snapshot, "_write_records", fail)
+    with pytest.raises(OSError):
+        asyncio.run(write_snapshot(AsyncMongoMockClient()["test"], tmp_path / "catalog.msgpack"))
+    assert list(tmp_path.iterdir()) == []
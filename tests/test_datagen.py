@@ -0,0 +1,47 @@
+import asyncio
+import random
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from utils.datagen import DatasetExistsError, _review_counts, generate_dataset
+
+
+def test_review_counts_distributes_remainder():
+    counts = _review_counts(random.Random(1), 37, 500)
+    assert sum(counts) == 500
+    assert _review_counts(random.Random(1), 0, 500) == []
+
+
+def test_same_seed_generates_same_documents():
+    async def generate():
+        db = AsyncMongoMockClient()["test"]
+        await generate_dataset(db, categories=2, companies=2, services=5, reviews=40, seed=7)
+        return await db.reviews.find({}, {"_id": 0}).to_list(None)
+
+    assert asyncio.run(generate()) == asyncio.run(generate())
+
+
+def test_rejects_existing_tag():
+    async def run():
+        db = AsyncMongoMockClient()["test"]
+        inserted = await generate_dataset(db, categories=2, companies=2, services=3, reviews=10, seed=7)
+        assert inserted["reviews"] == 10
+        with pytest.raises(DatasetExistsError):
+            await generate_dataset(db, categories=2, companies=2, services=3, reviews=10, seed=7)
+        assert await db.services.count_documents({}) == 3
+
+    asyncio.run(run())
+
+
+def test_same_seed_under_different_tags_does_not_collide():
+    async def run():
+        db = AsyncMongoMockClient()["test"]
+        for tag in ("a", "b"):
+            await generate_dataset(db, categories=2, companies=2, services=3, reviews=10, seed=7, tag=tag)
+        for collection in (db.categories, db.companies, db.services, db.reviews):
+            ids = [doc["id"] for doc in await collection.find({}, {"id": 1}).to_list(None)]
+            assert len(ids) == len(set(ids))
+        assert await db.services.count_documents({}) == 6
+
+    asyncio.run(run())
@@ -0,0 +1,17 @@
+from utils.http_cache import QUERY_MAX_AGE, CachePurger, cache_max_age
+
+
+def test_cache_max_age():
+    assert cache_max_age("/api/services") == 5
+    assert cache_max_age("/api/services/foo/similar") == 60
+    # 書き込み時に再取得されないクエリ付きURLは短い有効期間にする
+    assert cache_max_age("/api/services/foo/similar", "limit=3") == QUERY_MAX_AGE
+    assert cache_max_age("/api/articles/foo/related", "limit=5") == 5
+    # 検索は有効期間のみで管理する
+    assert cache_max_age("/api/search", "q=ai") == 30
+    assert cache_max_age("/api/auth/login") is None
+
+
+def test_purger_disabled_without_base_url():
+    assert not CachePurger(None).enabled
+    assert CachePurger("http://127.0.0.1:8080/").base_url == "http://127.0.0.1:8080"
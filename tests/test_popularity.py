@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timezone
+
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import BulkWriteError
+
+from utils.popularity import COLLECTION, PopularityCounter, bucket_starts
+
+
+class FlakyCollection:
+    """指定した位置の操作だけ失敗させる bulk_write の代替"""
+
+    def __init__(self, fail_indexes=()):
+        self.fail_indexes = set(fail_indexes)
+        self.applied = []
+
+    async def bulk_write(self, operations, ordered=True):
+        errors = []
+        for index, operation in enumerate(operations):
+            if index in self.fail_indexes:
+                errors.append({"index": index, "code": 11000, "errmsg": "duplicate key"})
+            else:
+                self.applied.append(operation._filter["granularity"])
+        self.fail_indexes = set()
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": 0})
+
+
+class FlakyDatabase(dict):
+    """services だけ mongomock を使い、人気度コレクションを差し替えるDB"""
+
+    def __init__(self, services, collection):
+        super().__init__({COLLECTION: collection})
+        self.services = services
+
+
+def test_flush_retries_only_failed_operations():
+    collection = FlakyCollection(fail_indexes={1})
+    services = AsyncMongoMockClient()["test"].services
+    counter = PopularityCounter(FlakyDatabase(services, collection))
+
+    async def run():
+        await services.insert_one({"id": "s1"})
+        counter.record("s1", "view", 3)
+        await counter.flush()
+        # 時間別・日別の2操作のうち失敗した1件だけを再送する
+        assert len(collection.applied) == 1
+        await counter.flush()
+        assert sorted(collection.applied) == ["day", "hour"]
+        await counter.flush()
+        assert len(collection.applied) == 2
+
+    asyncio.run(run())
+
+
+def test_record_respects_max_keys():
+    counter = PopularityCounter({}, max_keys=1)
+    counter.record("s1", "view")
+    counter.record("s2", "view")
+    counter.record("s1", "view")
+    assert counter.dropped == 1
+
+
+def test_unknown_service_ids_are_not_written_or_ranked():
+    db = AsyncMongoMockClient()["test"]
+    counter = PopularityCounter(db)
+
+    async def run():
+        await db.services.insert_many([{"id": "s1"}, {"id": "s2"}])
+        counter.record("s1", "view", 2)
+        counter.record("junk", "view", 5)
+        await counter.flush()
+        assert await db[COLLECTION].distinct("service_id") == ["s1"]
+
+        # 既に書き込まれた未知のIDが上位を占めても、実在するサービスで limit 件を埋める
+        day = bucket_starts(datetime.now(timezone.utc))["day"]
+        await db[COLLECTION].insert_many([
+            {"service_id": f"junk{i}", "granularity": "day", "bucket": day, "views": 100}
+            for i in range(5)
+        ])
+        counter.record("s2", "view", 1)
+        await counter.flush()
+        assert await counter.top_services(limit=2) == [("s1", 2), ("s2", 1)]
+
+    asyncio.run(run())
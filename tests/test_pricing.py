@@ -0,0 +1,28 @@
+from utils.pricing import PRICE_SORTS, price_query, pricing_fields
+
+
+def test_pricing_fields_normalizes_to_monthly():
+    fields = pricing_fields([
+        {"plan": "Free", "price_jpy": 0, "billing_cycle": "monthly"},
+        {"plan": "Pro", "price_jpy": 12000, "billing_cycle": "yearly"},
+        {"plan": "Team", "price_jpy": 3000, "billing_cycle": "monthly"},
+    ])
+    assert fields == {"price_monthly_min": 0, "price_monthly_max": 3000, "has_free_plan": True}
+
+
+def test_pricing_fields_without_plans():
+    assert pricing_fields([]) == {"price_monthly_min": None, "price_monthly_max": None, "has_free_plan": False}
+    assert pricing_fields([{"plan": "Pro", "price_jpy": 1000, "billing_cycle": "unknown"}])["price_monthly_min"] == 1000
+
+
+def test_price_query():
+    assert price_query() == {}
+    assert price_query(min_price=100, max_price=500, free_only=True) == {
+        "price_monthly_min": {"$gte": 100, "$lte": 500},
+        "has_free_plan": True,
+    }
+
+
+def test_price_sorts_have_tie_breaker():
+    for sort in PRICE_SORTS.values():
+        assert sort[-1][0] == "_id"
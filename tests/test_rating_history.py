@@ -0,0 +1,142 @@
+import asyncio
+from datetime import datetime, timezone
+
+from mongomock_motor import AsyncMongoMockClient
+
+from utils import rating_history
+from utils.datagen import generate_dataset
+from utils.rating_history import (
+    COLLECTION, GRANULARITIES, _rebuild_pipeline, apply_review_change, bucket_start, rating_increments,
+    rebuild_rating_history, summarize,
+)
+
+
+def test_bucket_start():
+    value = datetime(2026, 10, 15, 13, 30)  # 木曜日（タイムゾーンなしはUTCとして扱う）
+    assert bucket_start(value, "month") == datetime(2026, 10, 1, tzinfo=timezone.utc)
+    assert bucket_start(value, "week") == datetime(2026, 10, 12, tzinfo=timezone.utc)
+
+
+def test_rating_increments_skip_unset_dimensions():
+    review = {"rating": 4, "rating_uiux": 5, "rating_cost": None}
+    assert rating_increments(review) == {"count": 1, "rating_sum": 4.0, "uiux_sum": 5.0, "uiux_count": 1}
+    assert rating_increments(review, -1)["rating_sum"] == -4.0
+
+
+def test_summarize():
+    bucket = {"bucket": "b", "count": 3, "rating_sum": 10, "uiux_sum": 9, "uiux_count": 2}
+    assert summarize(bucket) == {
+        "bucket": "b", "count": 3, "average": 3.33,
+        "average_uiux": 4.5, "average_cost": None, "average_support": None,
+    }
+    assert summarize({"bucket": "b", "count": 0})["average"] is None
+
+
+def test_rebuild_pipeline_produces_incremental_fields():
+    review = {"rating": 4, "rating_uiux": 5, "rating_cost": 3, "rating_support": 2}
+    project = _rebuild_pipeline("week", {}, {"into": "tmp"})[2]["$project"]
+    assert set(rating_increments(review)) < set(project)
+    assert {"service_id", "granularity", "bucket"} < set(project)
+
+
+def test_apply_review_change():
+    async def run():
+        db = AsyncMongoMockClient()["test"]
+        created = datetime(2026, 3, 4, tzinfo=timezone.utc)
+        review = {"service_id": "s1", "created_at": created, "rating": 4.0, "rating_cost": 2.0}
+        await apply_review_change(db, None, review)
+        await apply_review_change(db, None, {**review, "rating": 2.0, "rating_cost": None})
+        await apply_review_change(db, review, {**review, "rating": 5.0})
+        month = await db[COLLECTION].find_one({"granularity": "month"})
+        assert summarize(month)["count"] == 2
+        assert summarize(month)["average"] == 3.5
+        assert summarize(month)["average_cost"] == 2.0
+        await apply_review_change(db, {**review, "rating": 5.0}, None)
+        week = await db[COLLECTION].find_one({"granularity": "week"})
+        assert (week["count"], week["rating_sum"], week["cost_count"]) == (1, 2.0, 0)
+
+    asyncio.run(run())
+
+
+def _pipeline_without_date_trunc(granularity, query, into):
+    # mongomock は $dateTrunc に対応していないため、bucket_start で事前に計算した値で置き換える
+    pipeline = _rebuild_pipeline(granularity, query, into)
+    pipeline[1]["$group"]["_id"]["bucket"] = f"$_bucket_{granularity}"
+    return pipeline
+
+
+class MergingDatabase:
+    """mongomock が対応していない末尾の $merge をクライアント側で適用するDB"""
+
+    def __init__(self, db):
+        self._db = db
+        self.reviews = MergingReviews(db)
+
+    def __getitem__(self, name):
+        return self._db[name]
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+class MergingReviews:
+    def __init__(self, db):
+        self._db = db
+
+    def aggregate(self, pipeline):
+        return MergeCursor(self._db, pipeline[:-1], pipeline[-1]["$merge"])
+
+
+class MergeCursor:
+    def __init__(self, db, stages, merge):
+        self._db, self._stages, self._merge = db, stages, merge
+
+    async def to_list(self, length):
+        target = self._db[self._merge["into"]]
+        async for document in self._db.reviews.aggregate(self._stages):
+            if "on" in self._merge:
+                key = {field: document[field] for field in self._merge["on"]}
+                await target.replace_one(key, document, upsert=True)
+            else:
+                await target.insert_one(document)
+        return []
+
+
+async def _buckets(db):
+    buckets = {}
+    async for bucket in db[COLLECTION].find({}, {"_id": 0, "rebuilt_at": 0}):
+        key = (bucket.pop("service_id"), bucket.pop("granularity"), bucket.pop("bucket").replace(tzinfo=None))
+        buckets[key] = {field: value for field, value in bucket.items() if value}
+    return buckets
+
+
+def test_rebuild_matches_incremental_buckets(monkeypatch):
+    monkeypatch.setattr(rating_history, "_rebuild_pipeline", _pipeline_without_date_trunc)
+
+    async def run():
+        db = AsyncMongoMockClient()["test"]
+        await generate_dataset(db, categories=2, companies=2, services=5, reviews=300, seed=3)
+        async for review in db.reviews.find({}, {"id": 1, "created_at": 1}):
+            await db.reviews.update_one({"id": review["id"]}, {"$set": {
+                f"_bucket_{granularity}": bucket_start(review["created_at"], granularity)
+                for granularity in GRANULARITIES
+            }})
+        incremental = await _buckets(db)
+        assert incremental
+        db = MergingDatabase(db)
+
+        # 全件: 一時コレクションに集計して差し替える
+        await db[COLLECTION].insert_one({"service_id": "deleted", "granularity": "month", "bucket": datetime(2020, 1, 1)})
+        assert await rebuild_rating_history(db) == len(incremental)
+        assert await _buckets(db) == incremental
+        assert "service_rating_history_rebuild" not in await db.list_collection_names()
+
+        # 1サービス: ずれたバケットを置き換え、対象外のバケットを削除する
+        service_id = next(iter(incremental))[0]
+        await db[COLLECTION].update_many({"service_id": service_id}, {"$inc": {"count": 5}})
+        await db[COLLECTION].insert_one({"service_id": service_id, "granularity": "week", "bucket": datetime(2020, 1, 6)})
+        expected = sum(1 for key in incremental if key[0] == service_id)
+        assert await rebuild_rating_history(db, service_id) == expected
+        assert await _buckets(db) == incremental
+
+    asyncio.run(run())
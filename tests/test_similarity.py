@@ -0,0 +1,66 @@
+import random
+
+import numpy as np
+
+from utils.similarity import BUILD_BLOCK_BYTES, BYTES_PER_SCORE, SimilarityIndex, build_block_size
+
+
+def make_service(rng, i):
+    words = ["文章生成", "画像生成", "翻訳", "議事録", "営業支援", "データ分析"]
+    price = rng.choice([0, 980, 2980, 9800])
+    return {
+        "id": f"s{i}",
+        "short_description": rng.choice(words) + "向けのツール",
+        "long_description": "".join(rng.sample(words, 3)),
+        "pros": [rng.choice(words)],
+        "cons": [],
+        "category_id": f"c{rng.randint(0, 3)}",
+        "vendor_id": f"v{rng.randint(0, 5)}",
+        "pricing_plan": [{"plan": "p", "price_jpy": price, "billing_cycle": "monthly"}],
+    }
+
+
+def scores(index, service_id):
+    return [round(score, 5) for _, score in index.neighbors(service_id)]
+
+
+def test_incremental_updates_match_full_rebuild():
+    rng = random.Random(3)
+    services = {f"s{i}": make_service(rng, i) for i in range(60)}
+    index = SimilarityIndex(top_k=5)
+    index.build(list(services.values())[:40])
+
+    for i in range(40, 60):
+        index.upsert(services[f"s{i}"])
+    for i in rng.sample(range(60), 10):
+        services[f"s{i}"] = make_service(rng, i)
+        index.upsert(services[f"s{i}"])
+    for i in rng.sample(range(60), 8):
+        index.remove(f"s{i}")
+        del services[f"s{i}"]
+
+    rebuilt = SimilarityIndex(top_k=5)
+    rebuilt.build(list(services.values()))
+    assert len(index) == len(rebuilt)
+    for service_id in services:
+        # 同点の並びは順不同のため類似度の列で比較する
+        assert np.allclose(scores(index, service_id), scores(rebuilt, service_id), atol=1e-4)
+
+
+def test_updates_during_build_are_replayed():
+    rng = random.Random(5)
+    index = SimilarityIndex(top_k=3)
+    index.begin_build()
+    # DBからの読み出し中に届いた更新
+    late = make_service(rng, 99)
+    index.upsert(late)
+    index.build([make_service(rng, i) for i in range(10)])
+    assert index.ready
+    assert index.neighbors("s99")
+    assert len(index) == 11
+
+
+def test_block_size_bounds_working_memory():
+    assert build_block_size(100) == 1024
+    for n in (10_000, 100_000, 1_000_000):
+        assert 1 <= build_block_size(n) * n * BYTES_PER_SCORE <= BUILD_BLOCK_BYTES
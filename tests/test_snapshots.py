@@ -0,0 +1,87 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from utils.snapshots import attach_snapshots, check_snapshots, fan_out_category, fan_out_company
+
+
+async def seed(db):
+    await db.companies.insert_many([
+        {"id": "c1", "name": "OpenAI", "logo": "openai.png"},
+        {"id": "c2", "name": "Anthropic", "logo": "anthropic.png"},
+    ])
+    await db.categories.insert_many([
+        {"id": "k1", "name": "チャット", "icon": "chat"},
+        {"id": "k2", "name": "画像生成", "icon": "image"},
+    ])
+    for i, (vendor_id, category_id) in enumerate([("c1", "k1"), ("c1", "k2"), ("c2", "k1")]):
+        service = {"id": f"s{i + 1}", "vendor_id": vendor_id, "category_id": category_id}
+        await attach_snapshots(db, service)
+        await db.services.insert_one(service)
+
+
+async def snapshots(db, field):
+    return {s["id"]: s[field] async for s in db.services.find({}, {"id": 1, field: 1})}
+
+
+def test_rename_fans_out_to_services():
+    db = AsyncMongoMockClient()["test"]
+
+    async def run():
+        await seed(db)
+        assert (await snapshots(db, "vendor"))["s1"] == {"name": "OpenAI", "logo": "openai.png"}
+
+        await db.companies.update_one({"id": "c1"}, {"$set": {"name": "OpenAI Inc."}})
+        company = await db.companies.find_one({"id": "c1"})
+        assert await fan_out_company(db, company, "c1") == 2
+        # 変更のないサービスは書き換えない
+        assert await fan_out_company(db, company, "c1") == 0
+        vendors = await snapshots(db, "vendor")
+        assert vendors["s1"]["name"] == vendors["s2"]["name"] == "OpenAI Inc."
+        assert vendors["s3"]["name"] == "Anthropic"
+
+        await db.categories.update_one({"id": "k1"}, {"$set": {"icon": "bubble"}})
+        category = await db.categories.find_one({"id": "k1"})
+        assert await fan_out_category(db, category, "k1") == 2
+        categories = await snapshots(db, "category")
+        assert categories["s1"] == categories["s3"] == {"name": "チャット", "icon": "bubble"}
+        assert categories["s2"]["icon"] == "image"
+
+    asyncio.run(run())
+
+
+def test_delete_clears_snapshot():
+    db = AsyncMongoMockClient()["test"]
+
+    async def run():
+        await seed(db)
+        await db.companies.delete_one({"id": "c2"})
+        assert await fan_out_company(db, None, "c2") == 1
+        await db.categories.delete_one({"id": "k2"})
+        assert await fan_out_category(db, None, "k2") == 1
+        assert (await snapshots(db, "vendor"))["s3"] is None
+        assert (await snapshots(db, "category"))["s2"] is None
+
+    asyncio.run(run())
+
+
+def test_check_snapshots_repairs_drift_and_orphans():
+    db = AsyncMongoMockClient()["test"]
+
+    async def run():
+        await seed(db)
+        assert await check_snapshots(db) == {"vendor": 0, "category": 0}
+
+        # 反映漏れ（名前のずれ）と、削除済みの企業・カテゴリへの参照を作る
+        await db.companies.update_one({"id": "c1"}, {"$set": {"logo": "openai.svg"}})
+        await db.companies.delete_one({"id": "c2"})
+        await db.categories.delete_one({"id": "k2"})
+
+        assert await check_snapshots(db) == {"vendor": 3, "category": 1}
+        vendors = await snapshots(db, "vendor")
+        assert vendors["s1"] == vendors["s2"] == {"name": "OpenAI", "logo": "openai.svg"}
+        assert vendors["s3"] is None
+        assert (await snapshots(db, "category"))["s2"] is None
+        assert await check_snapshots(db) == {"vendor": 0, "category": 0}
+
+    asyncio.run(run())
@@ -0,0 +1,89 @@
+import random
+
+from utils.suggest import SCAN_LIMIT, SuggestIndex, index_keys, normalize, to_romaji
+
+
+def test_normalize():
+    assert normalize("ＣｈａｔＧＰＴ　Plus") == "chatgpt plus"
+    assert normalize("ﾁｬｯﾄ") == "ちゃっと"
+    assert normalize("  クラウド   AI ") == "くらうど ai"
+
+
+def test_to_romaji():
+    assert to_romaji("ちゃっと") == "chatto"
+    assert to_romaji("しんぶん") == "shinbun"
+    assert to_romaji("きゃっしゅ") == "kyasshu"
+    assert to_romaji("まっち") == "matchi"
+    assert to_romaji("てぃーむ") == "tiimu"
+    assert to_romaji("ふぁいる") == "fairu"
+    assert to_romaji("こーど ai") == "koodo ai"
+
+
+def test_index_keys_include_romaji_and_word_starts():
+    keys = index_keys("チャット Enterprise", "chat-enterprise")
+    assert "ちゃっと enterprise" in keys
+    assert "chatto enterprise" in keys
+    assert "enterprise" in keys
+    assert "chat-enterprise" in keys
+
+
+def brute_force(entries, query, limit):
+    prefix = normalize(query)
+    matched = [
+        e for e in entries.values()
+        if any(key.startswith(prefix) for key in index_keys(e["name"], e["slug"]))
+    ]
+    matched.sort(key=lambda e: (-e["popularity"], len(e["name"]), e["name"]))
+    return [e["id"] for e in matched[:limit]]
+
+
+def make_entry(rng, i):
+    name = f"{rng.choice(['ネクスト', 'スマート', 'クラウド'])} {rng.choice(['Pro', 'Studio', 'One'])} {i}"
+    return {"id": f"s{i}", "name": name, "slug": f"svc-{i}"}, float(rng.randint(0, 50))
+
+
+def test_cache_patching_matches_brute_force():
+    rng = random.Random(11)
+    index = SuggestIndex()
+    entries = {}
+    initial = []
+    for i in range(SCAN_LIMIT * 3):
+        document, popularity = make_entry(rng, i)
+        entries[document["id"]] = {**document, "popularity": popularity}
+        initial.append(("service", document, popularity))
+    index.build(initial)
+
+    queries = ["ね", "ねくすと", "nekusuto", "くらうど pro", "svc", "svc-1", "svc-12", "pro", "studio", "s"]
+    for step in range(300):
+        op = rng.random()
+        entry_id = f"s{rng.randrange(SCAN_LIMIT * 4)}"
+        if op < 0.4:
+            document, popularity = make_entry(rng, int(entry_id[1:]))
+            index.upsert("service", document, popularity)
+            entries[entry_id] = {**document, "popularity": popularity}
+        elif op < 0.8 and entry_id in entries:
+            popularity = float(rng.randint(0, 50))
+            index.set_popularity("service", entry_id, popularity)
+            entries[entry_id]["popularity"] = popularity
+        elif entry_id in entries:
+            index.remove("service", entry_id)
+            del entries[entry_id]
+        if step % 30 == 0:
+            for query in queries:
+                assert [e["id"] for e in index.search(query, 10)] == brute_force(entries, query, 10), query
+
+    # キャッシュのないプレフィックスは一致件数が SCAN_LIMIT 以下
+    for key, _ in index._keys:
+        for length in range(1, len(key) + 1):
+            prefix = key[:length]
+            if prefix not in index._cache:
+                lo, hi = index._range(prefix)
+                assert hi - lo <= SCAN_LIMIT
+
+
+def test_updates_during_build_are_replayed():
+    index = SuggestIndex()
+    index.begin_build()
+    index.upsert("service", {"id": "late", "name": "レイト", "slug": "late"}, 1.0)
+    index.build([("service", {"id": "a", "name": "エー", "slug": "a"}, 0.0)])
+    assert [e["id"] for e in index.search("れい")] == ["late"]